@@ -14,7 +14,7 @@ def contract(app_id_arg, bond_id_arg, lv_arg):
         Txn.asset_amount() == Int(0),
         Txn.fee() <= Int(1000),
         Txn.xfer_asset() == Int(bond_id_arg),
-        Txn.last_valid() < Int(lv),
+        Txn.last_valid() < Int(lv_arg),
         Txn.asset_sender() == Global.zero_address(),  # will be frozen later st will use clawback
         Txn.asset_close_to() == Global.zero_address()
     )
@@ -25,6 +25,9 @@ def contract(app_id_arg, bond_id_arg, lv_arg):
     # TRADE
     on_trade = Global.group_size() >= Int(2)
 
+    # TRADE WITH COUPON
+    on_trade_coupon = Global.group_size() >= Int(3)
+
     # CLAIM PRINCIPAL OR DEFAULT
     on_end = Global.group_size() == Int(3)
 
@@ -55,6 +58,7 @@ def contract(app_id_arg, bond_id_arg, lv_arg):
                 Cond(
                     [Gtxn[0].application_args[0] == Bytes("buy"), on_buy],
                     [Gtxn[0].application_args[0] == Bytes("trade"), on_trade],
+                    [Gtxn[0].application_args[0] == Bytes("trade_coupon"), on_trade_coupon],
                     [
                         Or(
                             Gtxn[0].application_args[0] == Bytes("sell"),
@@ -28,6 +28,9 @@ def contract(app_id_arg, stablecoin_id_arg, lv_arg):
     # CLAIM COUPON
     on_coupon = And(Global.group_size() == Int(2), stablecoin_transfer(1))
 
+    # TRADE WITH COUPON
+    on_trade_coupon = And(Global.group_size() >= Int(3), stablecoin_transfer(2))
+
     # CLAIM PRINCIPAL
     on_principal = And(Global.group_size() == Int(3), stablecoin_transfer(2))
 
@@ -55,6 +58,7 @@ def contract(app_id_arg, stablecoin_id_arg, lv_arg):
                 Assert(linked_with_app_call),
                 Cond(
                     [Gtxn[0].application_args[0] == Bytes("coupon"), on_coupon],
+                    [Gtxn[0].application_args[0] == Bytes("trade_coupon"), on_trade_coupon],
                     [Gtxn[0].application_args[0] == Bytes("sell"), on_principal],
                     [Gtxn[0].application_args[0] == Bytes("default"), on_default]
                 )
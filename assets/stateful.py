@@ -102,7 +102,7 @@ def contract(stablecoin_id_arg):
 
     sender_bond_balance = AssetHolding.balance(Int(0), App.globalGet(Bytes("bond_id")))
     bond_escrow_balance = AssetHolding.balance(Int(1), App.globalGet(Bytes("bond_id")))
-    stablecoin_escrow_balance = AssetHolding.balance(Int(2), Int(stablecoin_id))
+    stablecoin_escrow_balance = AssetHolding.balance(Int(2), Int(stablecoin_id_arg))
     bond_total = AssetParam.total(App.globalGet(Bytes("bond_id")))
     num_bonds_in_circ = bond_total.value() - bond_escrow_balance.value()
 
@@ -201,7 +201,7 @@ def contract(stablecoin_id_arg):
         Gtxn[2].type_enum() == TxnType.AssetTransfer,
         Gtxn[2].sender() == Gtxn[0].sender(),
         Gtxn[2].asset_receiver() == App.globalGet(Bytes("issuer_addr")),
-        Gtxn[2].xfer_asset() == Int(stablecoin_id),
+        Gtxn[2].xfer_asset() == Int(stablecoin_id_arg),
         Gtxn[2].asset_amount() == (Gtxn[1].asset_amount() * App.globalGet(Bytes("bond_cost")))
     )
     # verify in buy period
@@ -269,24 +269,27 @@ def contract(stablecoin_id_arg):
     ])
 
     # CLAIM COUPON: Stateless contract accounts verifies everything else
+    # coupon holder is the index in the accounts array of who is being paid the coupon
+    coupon_holder = ScratchVar(TealType.uint64)
+    holder_bond_balance = AssetHolding.balance(coupon_holder.load(), App.globalGet(Bytes("bond_id")))
     # check star rating
-    coupons_paid = App.localGet(Int(0), Bytes("coupons_paid"))
+    coupons_paid = App.localGet(coupon_holder.load(), Bytes("coupons_paid"))
     star_rating = GetByte(App.globalGet(Bytes("ratings")), coupons_paid + Int(1))
     multiplier = get_multiplier(star_rating)
     # verify transfer of USDC is correct amount
     coupon_val = Div(App.globalGet(Bytes("bond_coupon")) * multiplier, Int(10000))
     coupon_val_stored = ScratchVar(TealType.uint64)
-    coupon_stablecoin_transfer = coupon_val_stored.load() * sender_bond_balance.value()
+    coupon_stablecoin_transfer = coupon_val_stored.load() * holder_bond_balance.value()
     coupon_stablecoin_transfer_stored = ScratchVar(TealType.uint64)
     # Update local coupons paid
     update_local_cp = App.localPut(
-        Int(0),
+        coupon_holder.load(),
         Bytes("coupons_paid"),
-        App.localGet(Int(0), Bytes("coupons_paid")) + Int(1)
+        App.localGet(coupon_holder.load(), Bytes("coupons_paid")) + Int(1)
     )
     # If claiming coupon for first time then update global coupons paid and reserve and verify has not defaulted
     new_coupon_update = If(
-        App.localGet(Int(0), Bytes("coupons_paid")) > App.globalGet(Bytes("coupons_paid")),
+        App.localGet(coupon_holder.load(), Bytes("coupons_paid")) > App.globalGet(Bytes("coupons_paid")),
         Seq([
             App.globalPut(
                 Bytes("coupons_paid"),
@@ -307,6 +310,19 @@ def contract(stablecoin_id_arg):
         Bytes("reserve"),
         App.globalGet(Bytes("reserve")) - coupon_stablecoin_transfer_stored.load()
     )
+    # requires coupon_holder, bond_total and bond_escrow_balance to be setup
+    coupon_setup = Seq([
+        holder_bond_balance,
+        coupon_val_stored.store(coupon_val),
+        coupon_stablecoin_transfer_stored.store(coupon_stablecoin_transfer)
+    ])
+    # owed coupon then update + check if defaulted
+    coupon_update = Seq([
+        Assert(coupons_paid < get_coupon_rounds(time)),
+        update_local_cp,
+        new_coupon_update,
+        sub_reserve
+    ])
     #
     on_coupon = Seq([
         Assert(Global.group_size() == Int(2)),
@@ -315,21 +331,68 @@ def contract(stablecoin_id_arg):
         Assert(Txn.accounts[1] == App.globalGet(Bytes("bond_escrow_addr"))),
         Assert(Txn.accounts[2] == App.globalGet(Bytes("stablecoin_escrow_addr"))),
         bond_total,
-        sender_bond_balance,
         bond_escrow_balance,
-        coupon_val_stored.store(coupon_val),
-        coupon_stablecoin_transfer_stored.store(coupon_stablecoin_transfer),
+        coupon_holder.store(Int(0)),
+        coupon_setup,
         # tx0 - call to this app
         # tx1 - coupon stablecoin transfer from escrow to caller
         Assert(Gtxn[1].sender() == App.globalGet(Bytes("stablecoin_escrow_addr"))),
         Assert(Gtxn[1].asset_receiver() == Gtxn[0].sender()),
         Assert(Gtxn[1].asset_amount() == coupon_stablecoin_transfer_stored.load()),
-        # owed coupon
-        Assert(coupons_paid < get_coupon_rounds(time)),
-        # update + check if defaulted
-        update_local_cp,
-        new_coupon_update,
-        sub_reserve,
+        coupon_update,
+        Int(1)
+    ])
+
+    # TRADE WITH COUPON: 3+ txns
+    # Trade to an existing owner where one party is a single coupon round behind the other.
+    # The lagging party is paid their owed coupon in the same group so both end up with same coupons_paid.
+    # Account 3 is the receiver so the escrows keep the same positions as in CLAIM COUPON.
+    # tx1. transfer of bond from sender to account 3
+    trade_coupon_bond_transfer = And(
+        linked_with_bond_escrow,
+        Gtxn[1].asset_sender() == Gtxn[0].sender(),
+        Gtxn[1].asset_receiver() == Gtxn[0].accounts[3],
+    )
+    # tx2. coupon stablecoin transfer from escrow to lagging party
+    lagging_addr = If(coupon_holder.load() == Int(0), Gtxn[0].sender(), Gtxn[0].accounts[3])
+    trade_coupon_stablecoin_transfer = And(
+        linked_with_stablecoin_escrow,
+        Gtxn[2].asset_receiver() == lagging_addr,
+        Gtxn[2].asset_amount() == coupon_stablecoin_transfer_stored.load()
+    )
+    trade_coupon_receiver_balance = AssetHolding.balance(Int(3), App.globalGet(Bytes("bond_id")))
+    #
+    on_trade_coupon = Seq([
+        Assert(Global.group_size() >= Int(3)),
+        # setup
+        maybe_time,
+        Assert(Txn.accounts[1] == App.globalGet(Bytes("bond_escrow_addr"))),
+        Assert(Txn.accounts[2] == App.globalGet(Bytes("stablecoin_escrow_addr"))),
+        bond_total,
+        bond_escrow_balance,
+        # receiver of bond must already be an owner
+        trade_coupon_receiver_balance,
+        Assert(trade_coupon_receiver_balance.value() > Int(0)),
+        # party with fewer coupons paid is paid coupon
+        coupon_holder.store(If(
+            App.localGet(Int(0), Bytes("coupons_paid")) < App.localGet(Int(3), Bytes("coupons_paid")),
+            Int(0),
+            Int(3)
+        )),
+        coupon_setup,
+        # tx0 - call to this app
+        Assert(trade_coupon_bond_transfer),  # tx1
+        Assert(trade_coupon_stablecoin_transfer),  # tx2
+        # tx 3,4,... Optional (e.g for payment when transferring bonds)
+        Assert(in_trade_window),
+        Assert(App.localGet(Int(3), Bytes("frozen"))),
+        coupon_update,
+        # verify lagging party was exactly one coupon round behind
+        Assert(
+            App.localGet(Int(0), Bytes("coupons_paid")) ==
+            App.localGet(Int(3), Bytes("coupons_paid"))
+        ),
+        update_trade,
         Int(1)
     ])
 
@@ -435,6 +498,7 @@ def contract(stablecoin_id_arg):
                         Cond(
                             [Txn.application_args[0] == Bytes("buy"), on_buy],
                             [Txn.application_args[0] == Bytes("trade"), on_trade],
+                            [Txn.application_args[0] == Bytes("trade_coupon"), on_trade_coupon],
                             [Txn.application_args[0] == Bytes("coupon"), on_coupon],
                             [Txn.application_args[0] == Bytes("sell"), on_principal],
                             [Txn.application_args[0] == Bytes("default"), on_default]
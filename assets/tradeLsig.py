@@ -7,12 +7,13 @@ def contract(app_id_arg, stablecoin_id_arg, bond_id_arg, lv_arg, trade_price_arg
     # NOTE: Lsig will remain valid until expiry
 
     # TRADE
-    # check call to stateful contract is "NoOp" with "trade" arg
+    # check call to stateful contract is "NoOp" with "trade" or "trade_coupon" arg
+    is_trade_coupon = Gtxn[0].application_args[0] == Bytes("trade_coupon")
     ssc_call = And(
         Gtxn[0].type_enum() == TxnType.ApplicationCall,
         Gtxn[0].application_id() == Int(app_id_arg),
         Gtxn[0].on_completion() == OnComplete.NoOp,
-        Gtxn[0].application_args[0] == Bytes("trade"),
+        Or(Gtxn[0].application_args[0] == Bytes("trade"), is_trade_coupon),
         Gtxn[0].fee() <= Int(1000),
         Gtxn[0].rekey_to() == Global.zero_address()
     )
@@ -27,13 +28,16 @@ def contract(app_id_arg, stablecoin_id_arg, bond_id_arg, lv_arg, trade_price_arg
         Gtxn[1].last_valid() < Int(lv_arg),
     )
     # verify transferring x bonds for y price
-    stablecoin = And(
-        Gtxn[2].type_enum() == TxnType.AssetTransfer,
-        Gtxn[2].xfer_asset() == Int(stablecoin_id_arg),
-        Gtxn[2].asset_amount() == (Int(trade_price_arg) * Gtxn[1].asset_amount()),
-        Gtxn[2].rekey_to() == Global.zero_address(),
-        Gtxn[2].asset_close_to() == Global.zero_address()
-    )
+    def stablecoin_transfer(txn_no) -> NaryExpr:
+        return And(
+            Gtxn[txn_no].type_enum() == TxnType.AssetTransfer,
+            Gtxn[txn_no].xfer_asset() == Int(stablecoin_id_arg),
+            Gtxn[txn_no].asset_amount() == (Int(trade_price_arg) * Gtxn[1].asset_amount()),
+            Gtxn[txn_no].rekey_to() == Global.zero_address(),
+            Gtxn[txn_no].asset_close_to() == Global.zero_address()
+        )
+    # coupon catch-up occupies tx2 when trading with coupon
+    stablecoin = If(is_trade_coupon, stablecoin_transfer(3), stablecoin_transfer(2))
 
     return And(ssc_call, fee, bond, stablecoin)
 
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+
+import yaml
+from algosdk import account, mnemonic
+from algosdk.v2client import algod
+
+from deploy.graph import Checkpoint, Deployer
+from deploy.standin import StandinAlgod
+from deploy.steps import steps
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m deploy",
+        description="Deploys many bond issues at once, as createapp.sh does for one"
+    )
+    parser.add_argument("config", help="YAML file of the issues to deploy")
+    parser.add_argument("--checkpoint", help="JSON file to resume from (default: <config>.checkpoint.json)")
+    parser.add_argument("--algod-address", default="http://localhost:8080")
+    parser.add_argument("--algod-token", default="a" * 64)
+    parser.add_argument("--standin", action="store_true", help="deploy to an in-memory stand-in for algod")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+
+    if args.standin:
+        client = StandinAlgod()
+        private_key, _ = account.generate_account()
+    else:
+        client = algod.AlgodClient(args.algod_token, args.algod_address)
+        if "CREATOR_MNEMONIC" not in os.environ:
+            sys.exit("CREATOR_MNEMONIC must be set to the mnemonic of the account which creates the issues")
+        private_key = mnemonic.to_private_key(os.environ["CREATOR_MNEMONIC"])
+
+    checkpoint = Checkpoint(args.checkpoint or args.config + ".checkpoint.json")
+    deployer = Deployer(client, steps(client, config, private_key), checkpoint)
+    failed = deployer.deploy()
+
+    for issue in config["issues"]:
+        done = checkpoint.done
+        name = issue["name"]
+        if name + "/update_app" in done and name + "/transfer_bonds" in done:
+            print("%s: app %d bond %d" % (name, done[name + "/create_app"]["app_id"], done[name + "/create_bond"]["bond_id"]))
+    if failed:
+        sys.exit("%d steps failed or were blocked: %s" % (len(failed), ", ".join(failed)))
+
+
+if __name__ == "__main__":
+    main()
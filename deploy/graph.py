@@ -0,0 +1,219 @@
+import json
+import os
+
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+
+
+class Step:
+    """
+    Node of the deployment graph, identified by key and run once all of deps are done.
+
+    Off-chain steps have run(outputs) which returns the step's outputs directly.
+    On-chain steps have build(outputs, sp) which returns a signed atomic group, and
+    confirmed(outputs, infos) which returns the step's outputs from the confirmed pending transaction infos.
+    recover(outputs, snapshot) checks the ledger for the effects of an on-chain step, returning its outputs if they are
+    there and None if not, so that a group which was lost or expired is only built again if it never landed.
+    snapshot(outputs) returns the ledger state the step's effects are told apart from (e.g. the assets which already
+    existed), which is taken before the group is built and saved with it, and is None for steps without one.
+    outputs is a dict of the outputs of all done steps keyed by step key.
+    """
+
+    def __init__(self, key, deps=(), run=None, build=None, confirmed=None, recover=None, snapshot=None):
+        self.key = key
+        self.deps = list(deps)
+        self.run = run
+        self.build = build
+        self.confirmed = confirmed or (lambda outputs, infos: {})
+        self.recover = recover or (lambda outputs, snapshot: None)
+        self.snapshot = snapshot or (lambda outputs: None)
+
+
+class Checkpoint:
+    """JSON file of done, submitted and failed steps which is rewritten atomically on every change"""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {"done": {}, "submitted": {}, "failed": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    @property
+    def done(self):
+        return self.state["done"]
+
+    @property
+    def submitted(self):
+        return self.state["submitted"]
+
+    @property
+    def failed(self):
+        return self.state["failed"]
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class Deployer:
+    """
+    Runs a dependency graph of steps, pipelining every ready step into the same round.
+
+    Each round all ready off-chain steps are run and all ready on-chain groups are submitted
+    without waiting on each other, then the scheduler waits for a single block and collects confirmations.
+    """
+
+    def __init__(self, client, steps, checkpoint, log=print):
+        self.client = client
+        self.steps = {step.key: step for step in steps}
+        self.checkpoint = checkpoint
+        self.log = log
+        for step in steps:
+            missing = [dep for dep in step.deps if dep not in self.steps]
+            if missing:
+                raise ValueError("Step %s depends on unknown steps %s" % (step.key, missing))
+        # retry failed steps from a previous run
+        self.checkpoint.failed.clear()
+
+    def ready(self):
+        done = self.checkpoint.done
+        return [
+            step for key, step in self.steps.items()
+            if key not in done and key not in self.checkpoint.submitted and key not in self.checkpoint.failed
+            and all(dep in done for dep in step.deps)
+        ]
+
+    def blocked(self):
+        """Returns keys of steps which cannot run because a dependency failed"""
+        failed = set(self.checkpoint.failed)
+        blocked = set()
+        changed = True
+        while changed:
+            changed = False
+            for key, step in self.steps.items():
+                if key not in blocked and key not in failed and any(d in failed | blocked for d in step.deps):
+                    blocked.add(key)
+                    changed = True
+        return blocked
+
+    def deploy(self):
+        """Runs all steps, returning keys of the steps which failed or were blocked by a failure"""
+        last_round = self.client.status()["last-round"]
+        self.resume(last_round)
+        while True:
+            self.run_off_chain()
+            self.submit(self.ready())
+            if not self.checkpoint.submitted:
+                break
+            last_round = self.client.status_after_block(last_round)["last-round"]
+            self.collect(last_round)
+            self.log("round %d: %d/%d steps done, %d submitted" % (
+                last_round, len(self.checkpoint.done), len(self.steps), len(self.checkpoint.submitted)
+            ))
+        return sorted(set(self.checkpoint.failed) | self.blocked())
+
+    def run_off_chain(self):
+        ready = [step for step in self.ready() if step.run is not None]
+        while ready:
+            for step in ready:
+                self.finish(step, self.guard(step, lambda: step.run(self.checkpoint.done)))
+            ready = [step for step in self.ready() if step.run is not None]
+
+    def submit(self, steps):
+        steps = [step for step in steps if step.build is not None]
+        if not steps:
+            return
+        sp = self.client.suggested_params()
+        groups = []
+        for step in steps:
+            snapshot = self.guard(step, lambda: step.snapshot(self.checkpoint.done))
+            if step.key in self.checkpoint.failed:
+                continue
+            group = self.guard(step, lambda: step.build(self.checkpoint.done, sp))
+            if group is None:
+                continue
+            groups.append((step, group))
+            self.checkpoint.submitted[step.key] = {
+                "txids": [txn.get_txid() for txn in group],
+                "last_valid": max(txn.transaction.last_valid_round for txn in group),
+                "group": [encoding.msgpack_encode(txn) for txn in group],
+                "snapshot": snapshot
+            }
+        # record groups before sending so that a crash in between resends the same transactions
+        self.checkpoint.save()
+        for step, group in groups:
+            try:
+                self.client.send_transactions(group)
+            except AlgodHTTPError as e:
+                self.fail(step, e)
+
+    def collect(self, last_round):
+        for key, submitted in list(self.checkpoint.submitted.items()):
+            step = self.steps[key]
+            try:
+                infos = [self.client.pending_transaction_info(txid) for txid in submitted["txids"]]
+            except AlgodHTTPError:
+                # no longer in pool, so either confirmed a while ago, dropped or never sent
+                self.reconcile(step, submitted, last_round)
+                continue
+            errors = [info["pool-error"] for info in infos if info.get("pool-error")]
+            if errors:
+                self.fail(step, errors[0])
+            elif all(info.get("confirmed-round", 0) > 0 for info in infos):
+                self.finish(step, self.guard(step, lambda: step.confirmed(self.checkpoint.done, infos)))
+            elif last_round >= submitted["last_valid"]:
+                self.reconcile(step, submitted, last_round)
+        self.checkpoint.save()
+
+    def resume(self, last_round):
+        """Reconciles steps submitted before a crash with the ledger"""
+        if self.checkpoint.submitted:
+            self.log("resuming %d submitted steps" % len(self.checkpoint.submitted))
+            self.collect(last_round)
+
+    def reconcile(self, step, submitted, last_round):
+        """Finishes a step whose group landed, else resends the same group or builds it again once expired"""
+        outputs = self.guard(step, lambda: step.recover(self.checkpoint.done, submitted.get("snapshot")))
+        if step.key in self.checkpoint.failed:
+            return
+        if outputs is not None:
+            self.finish(step, outputs)
+        elif last_round >= submitted["last_valid"]:
+            # can no longer be confirmed and did not land, so it is safe to build it again
+            del self.checkpoint.submitted[step.key]
+        else:
+            self.resend(step, submitted)
+
+    def resend(self, step, submitted):
+        # same transactions so the ledger rejects them if the earlier send has landed since
+        group = [encoding.future_msgpack_decode(txn) for txn in submitted["group"]]
+        try:
+            self.client.send_transactions(group)
+        except AlgodHTTPError as e:
+            # if already in the pool or ledger it is collected or recovered next round
+            if "already in ledger" not in str(e) and "already in pool" not in str(e):
+                self.fail(step, e)
+
+    def guard(self, step, f):
+        try:
+            return f()
+        except Exception as e:
+            self.fail(step, e)
+            return None
+
+    def finish(self, step, outputs):
+        # outputs is None if step failed
+        if outputs is None:
+            return
+        self.checkpoint.submitted.pop(step.key, None)
+        self.checkpoint.done[step.key] = outputs
+        self.checkpoint.save()
+
+    def fail(self, step, error):
+        self.log("step %s failed: %s" % (step.key, error))
+        self.checkpoint.submitted.pop(step.key, None)
+        self.checkpoint.failed[step.key] = str(error)
+        self.checkpoint.save()
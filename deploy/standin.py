@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import time
+
+from algosdk import logic
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+
+GENESIS_HASH = base64.b64encode(hashlib.sha256(b"algo-green-bond/standin").digest()).decode()
+
+
+class StandinAlgod:
+    """
+    In-memory stand-in for the algod endpoints used by the deployer.
+
+    Every group sent is confirmed in the next block, which is made on each call to status_after_block
+    (after sleeping block_time seconds). It records the assets and apps created, algo received, opt-ins,
+    asset transfers and config and app updates so that steps can be chained and recovered, but checks
+    no balances. The only program rule applied is that of bondEscrow.py and stablecoinEscrow.py: a logic sig
+    opt-in is rejected unless it is the only transaction in its group.
+    """
+
+    def __init__(self, block_time=0, first_asset_id=1):
+        self.block_time = block_time
+        self.round = 1
+        self.next_id = first_asset_id
+        self.pending = []
+        self.confirmed = {}
+        self.accounts = {}
+        self.assets = {}
+        self.apps = {}
+        self.sent = 0
+
+    def status(self):
+        return {"last-round": self.round}
+
+    def status_after_block(self, round_num):
+        while self.round <= round_num:
+            if self.block_time:
+                time.sleep(self.block_time)
+            self.round += 1
+            for group in self.pending:
+                self.confirm(group)
+            self.pending = []
+        return self.status()
+
+    def suggested_params(self):
+        return transaction.SuggestedParams(
+            0, self.round, self.round + 1000, GENESIS_HASH, "standin-v1", min_fee=1000
+        )
+
+    def send_transactions(self, group):
+        pending = {stxn.get_txid() for g in self.pending for stxn in g}
+        for stxn in group:
+            txid = stxn.get_txid()
+            if txid in self.confirmed:
+                raise AlgodHTTPError("TransactionPool.Remember: transaction already in ledger: %s" % txid, 400)
+            if txid in pending:
+                raise AlgodHTTPError("TransactionPool.Remember: transaction already in pool: %s" % txid, 400)
+            if stxn.transaction.last_valid_round <= self.round:
+                raise AlgodHTTPError("TransactionPool.Remember: txn dead: round %d outside of %d--%d" % (
+                    self.round + 1, stxn.transaction.first_valid_round, stxn.transaction.last_valid_round
+                ), 400)
+            if len(group) > 1 and isinstance(stxn, transaction.LogicSigTransaction) and is_opt_in(stxn.transaction):
+                raise AlgodHTTPError(
+                    "TransactionPool.Remember: transaction %s: rejected by logic err=opt-in in group of %d" % (
+                        txid, len(group)
+                    ), 400
+                )
+        self.sent += len(group)
+        self.pending.append(group)
+        return group[0].get_txid()
+
+    def pending_transaction_info(self, txid):
+        if txid in self.confirmed:
+            return self.confirmed[txid]
+        if any(stxn.get_txid() == txid for g in self.pending for stxn in g):
+            return {"pool-error": "", "confirmed-round": 0}
+        raise AlgodHTTPError("txn does not exist", 404)
+
+    def account_info(self, address):
+        return self.accounts.get(address, {"address": address, "amount": 0})
+
+    def asset_info(self, asset_id):
+        if asset_id not in self.assets:
+            raise AlgodHTTPError("asset does not exist", 404)
+        return self.assets[asset_id]
+
+    def application_info(self, app_id):
+        if app_id not in self.apps:
+            raise AlgodHTTPError("application does not exist", 404)
+        return self.apps[app_id]
+
+    def compile(self, source):
+        # unique but valid program so that logic sigs and addresses can be made from it
+        program = b"\x02\x26\x01\x20" + hashlib.sha256(source.encode()).digest() + b"\x20\x01\x01\x22"
+        return {"result": base64.b64encode(program).decode(), "hash": logic.address(program)}
+
+    def account(self, address):
+        return self.accounts.setdefault(address, {"address": address, "amount": 0})
+
+    def holding(self, address, asset_id):
+        holdings = self.account(address).setdefault("assets", [])
+        for holding in holdings:
+            if holding["asset-id"] == asset_id:
+                return holding
+        holdings.append({"asset-id": asset_id, "amount": 0})
+        return holdings[-1]
+
+    def confirm(self, group):
+        for stxn in group:
+            txn = stxn.transaction
+            info = {"pool-error": "", "confirmed-round": self.round, "txn": {"txn": txn.dictify()}}
+            account = self.account(txn.sender)
+            # dispatch on type rather than class, as resent groups are decoded as the generic classes
+            if txn.type == "acfg" and not txn.index:
+                info["asset-index"] = self.next_id
+                asset = self.assets[self.next_id] = {
+                    "index": self.next_id,
+                    "params": {
+                        "name": txn.asset_name, "unit-name": txn.unit_name, "total": txn.total,
+                        "manager": txn.manager, "reserve": txn.reserve, "freeze": txn.freeze, "clawback": txn.clawback
+                    }
+                }
+                account.setdefault("created-assets", []).append(asset)
+                self.holding(txn.sender, self.next_id)["amount"] = txn.total
+                self.next_id += 1
+            elif txn.type == "acfg":
+                params = self.assets[txn.index]["params"]
+                for field in ["manager", "reserve", "freeze", "clawback"]:
+                    params[field] = getattr(txn, field) or None
+            elif txn.type == "axfer":
+                receiver = self.holding(txn.receiver, txn.index)
+                if not is_opt_in(txn):
+                    self.holding(txn.revocation_target or txn.sender, txn.index)["amount"] -= txn.amount
+                    receiver["amount"] += txn.amount
+            elif txn.type == "pay":
+                self.account(txn.receiver)["amount"] += txn.amt
+            elif txn.type == "appl" and not txn.index:
+                info["application-index"] = self.next_id
+                # initial.py stores bond_id from the fourth arg
+                bond_id = int.from_bytes(txn.app_args[3], "big")
+                app = self.apps[self.next_id] = {
+                    "id": self.next_id,
+                    "params": {
+                        "approval-program": base64.b64encode(txn.approval_program).decode(),
+                        "global-state": [{
+                            "key": base64.b64encode(b"bond_id").decode(),
+                            "value": {"type": 2, "uint": bond_id}
+                        }]
+                    }
+                }
+                account.setdefault("created-apps", []).append(app)
+                self.next_id += 1
+            elif txn.type == "appl" and txn.on_complete == transaction.OnComplete.UpdateApplicationOC:
+                self.apps[txn.index]["params"]["approval-program"] = base64.b64encode(txn.approval_program).decode()
+            self.confirmed[stxn.get_txid()] = info
+
+
+def is_opt_in(txn):
+    return txn.type == "axfer" and not txn.amount and txn.receiver == txn.sender and not txn.revocation_target
@@ -0,0 +1,297 @@
+import base64
+import os
+import sys
+
+from algosdk import account
+from algosdk.encoding import decode_address
+from algosdk.future import transaction
+from pyteal import compileTeal, Mode
+
+from deploy.graph import Step
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets"))
+
+import bondEscrow  # noqa: E402
+import clear  # noqa: E402
+import initial  # noqa: E402
+import stablecoinEscrow  # noqa: E402
+import stateful  # noqa: E402
+
+# Same as createapp.sh
+STABLECOIN_TOTAL = 100000000000000000
+ESCROW_ALGOS = 1000000000
+STABLECOIN_FUNDING = 10000000000
+GLOBAL_SCHEMA = transaction.StateSchema(num_uints=11, num_byte_slices=6)
+LOCAL_SCHEMA = transaction.StateSchema(num_uints=3, num_byte_slices=0)
+# Rounds after compilation for which escrows can be opted in to their asset
+ESCROW_LV_ROUNDS = 2000
+
+
+def compile_program(client, source):
+    response = client.compile(source)
+    return {"program": response["result"], "address": response["hash"]}
+
+
+def program(outputs, key, name=None):
+    compiled = outputs[key] if name is None else outputs[key][name]
+    return base64.b64decode(compiled["program"])
+
+
+def sign(txns, private_key):
+    if len(txns) > 1:
+        transaction.assign_group_id(txns)
+    return [txn.sign(private_key) for txn in txns]
+
+
+def created_assets(client, creator):
+    """Returns ids of all assets created by creator, as the snapshot of a step creating one"""
+    return sorted(asset["index"] for asset in client.account_info(creator).get("created-assets", []))
+
+
+def find_asset(client, creator, name, unit_name, existing):
+    """
+    Returns id of latest asset created by creator with name and unit name which is not in existing, or None if there
+    is none, so that an asset of the same name from before the step was built (e.g. of an earlier deployment) is not
+    taken for the one the step created
+    """
+    assets = [
+        asset["index"] for asset in client.account_info(creator).get("created-assets", [])
+        if asset["params"].get("name") == name and asset["params"].get("unit-name") == unit_name
+        and asset["index"] not in (existing or [])
+    ]
+    return max(assets, default=None)
+
+
+def find_app(client, creator, bond_id):
+    """Returns id of latest app created by creator for bond_id, or None if there is none"""
+    apps = []
+    for app in client.account_info(creator).get("created-apps", []):
+        for kv in app["params"].get("global-state", []):
+            if base64.b64decode(kv["key"]) == b"bond_id" and kv["value"].get("uint") == bond_id:
+                apps.append(app["id"])
+    return max(apps, default=None)
+
+
+def recover_id(found_id, name):
+    """Returns outputs for a recover of a created asset or app, or None if it was not found"""
+    return None if found_id is None else {name: found_id}
+
+
+def outputs_if(found, outputs):
+    """Returns outputs for a recover if found, else None"""
+    return outputs if found else None
+
+
+def has_balance(client, address, amount):
+    return client.account_info(address).get("amount", 0) >= amount
+
+
+def has_opted_in(client, address, asset_id):
+    return any(asset["asset-id"] == asset_id for asset in client.account_info(address).get("assets", []))
+
+
+def shared_steps(client, config, private_key):
+    creator = account.address_from_private_key(private_key)
+    steps = [
+        Step("compile/initial", run=lambda outputs: compile_program(
+            client, compileTeal(initial.contract(), Mode.Application, version=4)
+        )),
+        Step("compile/clear", run=lambda outputs: compile_program(
+            client, compileTeal(clear.contract(), Mode.Application, version=2)
+        )),
+        Step("compile/stateful", ["stablecoin"], run=lambda outputs: compile_program(
+            client,
+            compileTeal(stateful.contract(outputs["stablecoin"]["stablecoin_id"]), Mode.Application, version=4)
+        ))
+    ]
+
+    # use existing stablecoin if given, else create one for all issues
+    if config.get("stablecoin_id") is not None:
+        steps.append(Step("stablecoin", run=lambda outputs: {"stablecoin_id": config["stablecoin_id"]}))
+    else:
+        steps.append(Step(
+            "stablecoin",
+            build=lambda outputs, sp: sign([transaction.AssetCreateTxn(
+                creator, sp, STABLECOIN_TOTAL, 6, False,
+                manager=creator, reserve=creator, freeze=creator, clawback=creator,
+                unit_name="USDC", asset_name="USDC"
+            )], private_key),
+            confirmed=lambda outputs, infos: {"stablecoin_id": infos[0]["asset-index"]},
+            recover=lambda outputs, existing: recover_id(
+                find_asset(client, creator, "USDC", "USDC", existing), "stablecoin_id"
+            ),
+            snapshot=lambda outputs: created_assets(client, creator)
+        ))
+    return steps
+
+
+def issue_steps(client, config, private_key, issue):
+    """Returns the steps of createapp.sh for a single bond issue, each key prefixed by the issue name"""
+    creator = account.address_from_private_key(private_key)
+    name = issue["name"]
+    issuer = issue.get("issuer_addr", creator)
+    escrow_algos = config.get("escrow_algos", ESCROW_ALGOS)
+
+    def key(step):
+        return name + "/" + step
+
+    def ids(outputs):
+        return (
+            outputs[key("create_app")]["app_id"],
+            outputs[key("create_bond")]["bond_id"],
+            outputs["stablecoin"]["stablecoin_id"]
+        )
+
+    # create bond with creator as clawback until supply is moved to escrow
+    def create_bond(outputs, sp):
+        return sign([transaction.AssetCreateTxn(
+            creator, sp, issue["bond_total"], 0, True,
+            manager=creator, reserve=creator, freeze=creator, clawback=creator,
+            unit_name="bond", asset_name=name
+        )], private_key)
+
+    # create app with initial.py
+    def create_app(outputs, sp):
+        args = [
+            issue["start_buy_date"], issue["end_buy_date"], issue["maturity_date"],
+            outputs[key("create_bond")]["bond_id"],
+            issue["bond_coupon"], issue["bond_principal"], issue["bond_length"], issue["bond_cost"]
+        ]
+        app_args = [arg.to_bytes(8, "big") for arg in args] + [
+            decode_address(addr) for addr in [issuer, issue["financial_regulator_addr"], issue["green_verifier_addr"]]
+        ]
+        return sign([transaction.ApplicationCreateTxn(
+            creator, sp, transaction.OnComplete.NoOpOC,
+            program(outputs, "compile/initial"), program(outputs, "compile/clear"),
+            GLOBAL_SCHEMA, LOCAL_SCHEMA, app_args=app_args, extra_pages=1
+        )], private_key)
+
+    # compile escrows (off-chain)
+    def compile_escrows(outputs):
+        app_id, bond_id, stablecoin_id = ids(outputs)
+        lv = config.get("escrow_lv") or client.status()["last-round"] + ESCROW_LV_ROUNDS
+        return {
+            "lv": lv,
+            "bond_escrow": compile_program(
+                client, compileTeal(bondEscrow.contract(app_id, bond_id, lv), Mode.Signature, version=4)
+            ),
+            "stablecoin_escrow": compile_program(
+                client, compileTeal(stablecoinEscrow.contract(app_id, stablecoin_id, lv), Mode.Signature, version=4)
+            )
+        }
+
+    # fund escrows
+    def fund_escrows(outputs, sp):
+        escrows = outputs[key("compile_escrows")]
+        return sign([
+            transaction.PaymentTxn(creator, sp, escrows[escrow]["address"], escrow_algos)
+            for escrow in ["bond_escrow", "stablecoin_escrow"]
+        ], private_key)
+
+    def escrows_funded(outputs, snapshot):
+        escrows = outputs[key("compile_escrows")]
+        return outputs_if(all(
+            has_balance(client, escrows[escrow]["address"], escrow_algos) for escrow in ["bond_escrow", "stablecoin_escrow"]
+        ), {})
+
+    # opt escrow in to its asset, on its own as the escrows only approve opt-ins outside of a group
+    def opt_in(escrow, asset):
+        def build(outputs, sp):
+            escrows = outputs[key("compile_escrows")]
+            opt_in_sp = transaction.SuggestedParams(
+                max(sp.min_fee or 0, 1000), sp.first, min(sp.last, escrows["lv"] - 1), sp.gh, sp.gen, flat_fee=True
+            )
+            return [transaction.LogicSigTransaction(
+                transaction.AssetOptInTxn(escrows[escrow]["address"], opt_in_sp, asset_id(outputs, asset)),
+                transaction.LogicSig(program(outputs, key("compile_escrows"), escrow))
+            )]
+
+        def recover(outputs, snapshot):
+            address = outputs[key("compile_escrows")][escrow]["address"]
+            return outputs_if(has_opted_in(client, address, asset_id(outputs, asset)), {})
+
+        return Step(key("opt_in_" + escrow), [key("fund_escrows")], build=build, recover=recover)
+
+    def asset_id(outputs, asset):
+        _, bond_id, stablecoin_id = ids(outputs)
+        return bond_id if asset == "bond" else stablecoin_id
+
+    # move bond supply to escrow, make escrow the clawback and fund stablecoin escrow
+    def transfer_bonds(outputs, sp):
+        _, bond_id, stablecoin_id = ids(outputs)
+        escrows = outputs[key("compile_escrows")]
+        txns = [
+            transaction.AssetTransferTxn(
+                creator, sp, escrows["bond_escrow"]["address"], issue["bond_total"], bond_id, revocation_target=creator
+            ),
+            transaction.AssetConfigTxn(
+                creator, sp, index=bond_id, manager="", reserve=creator, freeze="",
+                clawback=escrows["bond_escrow"]["address"], strict_empty_address_check=False
+            )
+        ]
+        funding = issue.get("stablecoin_funding", STABLECOIN_FUNDING)
+        if funding:
+            txns.append(transaction.AssetTransferTxn(
+                creator, sp, escrows["stablecoin_escrow"]["address"], funding, stablecoin_id
+            ))
+        return sign(txns, private_key)
+
+    # group is atomic so the escrow being clawback means the supply was moved too
+    def bonds_transferred(outputs, snapshot):
+        _, bond_id, _ = ids(outputs)
+        clawback = client.asset_info(bond_id)["params"].get("clawback")
+        return outputs_if(clawback == outputs[key("compile_escrows")]["bond_escrow"]["address"], {})
+
+    # update app to stateful.py
+    def update_app(outputs, sp):
+        escrows = outputs[key("compile_escrows")]
+        return sign([transaction.ApplicationUpdateTxn(
+            creator, sp, outputs[key("create_app")]["app_id"],
+            program(outputs, "compile/stateful"), program(outputs, "compile/clear"),
+            app_args=[
+                decode_address(escrows["stablecoin_escrow"]["address"]),
+                decode_address(escrows["bond_escrow"]["address"])
+            ]
+        )], private_key)
+
+    def app_updated(outputs, snapshot):
+        app = client.application_info(outputs[key("create_app")]["app_id"])
+        return outputs_if(app["params"].get("approval-program") == outputs["compile/stateful"]["program"], {})
+
+    return [
+        Step(
+            key("create_bond"), build=create_bond,
+            confirmed=lambda outputs, infos: {"bond_id": infos[0]["asset-index"]},
+            recover=lambda outputs, existing: recover_id(
+                find_asset(client, creator, name, "bond", existing), "bond_id"
+            ),
+            snapshot=lambda outputs: created_assets(client, creator)
+        ),
+        Step(
+            key("create_app"), [key("create_bond"), "compile/initial", "compile/clear"], build=create_app,
+            confirmed=lambda outputs, infos: {"app_id": infos[0]["application-index"]},
+            recover=lambda outputs, snapshot: recover_id(
+                find_app(client, creator, outputs[key("create_bond")]["bond_id"]), "app_id"
+            )
+        ),
+        Step(key("compile_escrows"), [key("create_app"), "stablecoin"], run=compile_escrows),
+        Step(key("fund_escrows"), [key("compile_escrows")], build=fund_escrows, recover=escrows_funded),
+        opt_in("bond_escrow", "bond"),
+        opt_in("stablecoin_escrow", "stablecoin"),
+        Step(
+            key("transfer_bonds"), [key("opt_in_bond_escrow"), key("opt_in_stablecoin_escrow")], build=transfer_bonds,
+            recover=bonds_transferred
+        ),
+        # initial.py only allows the update on its own
+        Step(key("update_app"), [key("compile_escrows"), "compile/stateful"], build=update_app, recover=app_updated)
+    ]
+
+
+def steps(client, config, private_key):
+    names = [issue["name"] for issue in config["issues"]]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError("Duplicate issue names %s" % duplicates)
+    return shared_steps(client, config, private_key) + [
+        step for issue in config["issues"] for step in issue_steps(client, config, private_key, issue)
+    ]
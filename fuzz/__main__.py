@@ -0,0 +1,47 @@
+import argparse
+import os
+
+from algosdk.v2client import algod
+
+from fuzz.dryrun import compile_programs
+from fuzz.engine import Fuzzer, make_pool
+
+FUZZ_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m fuzz",
+        description="Differential fuzzer of the contracts in assets/ against a reference model"
+    )
+    parser.add_argument("--algod-address", default="http://localhost:8080")
+    parser.add_argument("--algod-token", default="a" * 64)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--cases", type=int, help="number of mutated cases to run")
+    parser.add_argument("--duration", type=float, help="seconds to fuzz for")
+    parser.add_argument("--max-mutations", type=int, default=4)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--corpus", default=os.path.join(FUZZ_DIR, "corpus"))
+    parser.add_argument("--crashes", default=os.path.join(FUZZ_DIR, "crashes"))
+    parser.add_argument("--minimize", action="store_true", help="only minimize the corpus")
+    parser.add_argument("--replay", action="store_true", help="only replay the crash corpus")
+    args = parser.parse_args()
+
+    compiled = compile_programs(algod.AlgodClient(args.algod_token, args.algod_address))
+    with make_pool(args.processes, args.algod_address, args.algod_token, compiled) as pool:
+        fuzzer = Fuzzer(pool, args.corpus, args.crashes, args.seed, args.max_mutations)
+
+        reproduced = fuzzer.replay_crashes()
+        print("%d crashes in %s still reproduce" % (len(reproduced), args.crashes))
+        if args.replay:
+            return
+
+        if not args.minimize:
+            fuzzer.fuzz(args.cases, args.duration)
+
+        before, after = fuzzer.minimize()
+        print("minimized corpus from %d to %d cases" % (before, after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import copy
+
+# A case is a JSON serialisable description of a ledger state and a transaction group.
+# Accounts are referred to by actor name, "zero" being the zero address.
+# App args are either str (utf-8 bytes) or int (8 byte big-endian).
+
+APP_ID = 13
+BOND_ID = 1
+STABLECOIN_ID = 2
+LV = 1500
+TRADE_PRICE = 70
+
+PEOPLE = ["master", "issuer", "investor", "trader", "regulator", "verifier"]
+ESCROWS = ["bond_escrow", "stablecoin_escrow"]
+ACTORS = PEOPLE + ESCROWS + ["zero"]
+SIGNERS = ["sk", "bond_escrow", "stablecoin_escrow", "trade_lsig"]
+
+HANDLERS = [
+    "advance_time", "set_trade", "freeze", "freeze_all", "rate",
+    "buy", "trade", "trade_coupon", "coupon", "sell", "default"
+]
+
+# Bond parameters (same as test/utils.js)
+PERIOD = 15768000
+BOND_LENGTH = 4
+START_BUY_DATE = 50
+END_BUY_DATE = START_BUY_DATE + 50
+MATURITY_DATE = END_BUY_DATE + (PERIOD * BOND_LENGTH)
+BOND_COST = 50
+BOND_COUPON = 25
+BOND_PRINCIPAL = 100
+BOND_TOTAL = 100000000
+
+MAX_UINT64 = 2 ** 64 - 1
+INTERESTING_TIMES = [
+    0, START_BUY_DATE, END_BUY_DATE, END_BUY_DATE + PERIOD, END_BUY_DATE + 2 * PERIOD, MATURITY_DATE
+]
+
+
+def base_state(timestamp):
+    return {
+        "timestamp": timestamp,
+        "bond_total": BOND_TOTAL,
+        "global": {
+            "stablecoin_escrow_addr": "stablecoin_escrow",
+            "bond_escrow_addr": "bond_escrow",
+            "issuer_addr": "issuer",
+            "financial_regulator_addr": "regulator",
+            "green_verifier_addr": "verifier",
+            "start_buy_date": START_BUY_DATE,
+            "end_buy_date": END_BUY_DATE,
+            "maturity_date": MATURITY_DATE,
+            "bond_id": BOND_ID,
+            "bond_coupon": BOND_COUPON,
+            "bond_principal": BOND_PRINCIPAL,
+            "bond_length": BOND_LENGTH,
+            "bond_cost": BOND_COST,
+            "frozen": 1,
+            "coupons_paid": 0,
+            "reserve": 0,
+            "ratings": "00" * 100
+        },
+        # actor is opted into app iff present
+        "local": {
+            "investor": {"frozen": 1, "trade": 3, "coupons_paid": 0},
+            "trader": {"frozen": 1, "trade": 0, "coupons_paid": 0}
+        },
+        # actor is opted into asset iff present
+        "holdings": {
+            "bond_escrow": {"bond": BOND_TOTAL - 3},
+            "stablecoin_escrow": {"stablecoin": 1000000},
+            "issuer": {"stablecoin": 0},
+            "investor": {"bond": 3, "stablecoin": 0},
+            "trader": {"bond": 0, "stablecoin": 1000000}
+        }
+    }
+
+
+def app_call(sender, args, accounts=None, signer="sk", fee=1000):
+    return {
+        "type": "appl", "signer": signer, "sender": sender, "fee": fee, "last_valid": 1000,
+        "rekey_to": "zero", "args": args, "accounts": accounts or []
+    }
+
+
+def asset_transfer(sender, asset, amount, receiver, asset_sender="zero", signer="sk", fee=0):
+    return {
+        "type": "axfer", "signer": signer, "sender": sender, "fee": fee, "last_valid": 1000,
+        "rekey_to": "zero", "asset": asset, "amount": amount, "receiver": receiver,
+        "asset_sender": asset_sender, "close_to": "zero"
+    }
+
+
+def payment(sender, receiver, amount, fee=1000):
+    return {
+        "type": "pay", "signer": "sk", "sender": sender, "fee": fee, "last_valid": 1000,
+        "rekey_to": "zero", "amount": amount, "receiver": receiver
+    }
+
+
+def coupon_round_state(timestamp):
+    # investor (3 bonds) has claimed first coupon, trader (1 bond) has not
+    case = base_state(timestamp)
+    case["global"]["coupons_paid"] = 1
+    case["global"]["reserve"] = BOND_COUPON
+    case["local"]["investor"]["coupons_paid"] = 1
+    case["holdings"]["bond_escrow"]["bond"] = BOND_TOTAL - 4
+    case["holdings"]["trader"]["bond"] = 1
+    return case
+
+
+def seeds():
+    """Returns one valid case per handler and escrow path"""
+    cases = []
+
+    def add(label, case, txns):
+        case["label"] = label
+        case["txns"] = txns
+        cases.append(case)
+
+    case = base_state(START_BUY_DATE)
+    case["holdings"]["investor"]["bond"] = 0
+    case["holdings"]["bond_escrow"]["bond"] = BOND_TOTAL
+    case["holdings"]["investor"]["stablecoin"] = 3 * BOND_COST
+    add("buy", case, [
+        app_call("investor", ["buy"], fee=2000),
+        asset_transfer("bond_escrow", "bond", 3, "investor", "bond_escrow", "bond_escrow"),
+        asset_transfer("investor", "stablecoin", 3 * BOND_COST, "issuer", fee=1000)
+    ])
+
+    add("trade", base_state(END_BUY_DATE + 1), [
+        app_call("investor", ["trade"], ["trader"], fee=2000),
+        asset_transfer("bond_escrow", "bond", 2, "trader", "investor", "bond_escrow")
+    ])
+
+    add("trade_lsig", base_state(END_BUY_DATE + 1), [
+        app_call("investor", ["trade"], ["trader"], "trade_lsig"),
+        asset_transfer("bond_escrow", "bond", 2, "trader", "investor", "bond_escrow"),
+        asset_transfer("trader", "stablecoin", 2 * TRADE_PRICE, "investor", fee=2000)
+    ])
+
+    trade_coupon_txns = [
+        app_call("investor", ["trade_coupon"], ["bond_escrow", "stablecoin_escrow", "trader"], fee=3000),
+        asset_transfer("bond_escrow", "bond", 2, "trader", "investor", "bond_escrow"),
+        asset_transfer("stablecoin_escrow", "stablecoin", BOND_COUPON, "trader", signer="stablecoin_escrow")
+    ]
+    add("trade_coupon", coupon_round_state(END_BUY_DATE + PERIOD + 1), trade_coupon_txns)
+
+    trade_coupon_txns = copy.deepcopy(trade_coupon_txns)
+    trade_coupon_txns[0]["signer"] = "trade_lsig"
+    trade_coupon_txns[0]["fee"] = 1000
+    trade_coupon_txns.append(asset_transfer("trader", "stablecoin", 2 * TRADE_PRICE, "investor", fee=3000))
+    add("trade_coupon_lsig", coupon_round_state(END_BUY_DATE + PERIOD + 1), trade_coupon_txns)
+
+    add("coupon", base_state(END_BUY_DATE + PERIOD + 1), [
+        app_call("investor", ["coupon"], ["bond_escrow", "stablecoin_escrow"], fee=2000),
+        asset_transfer("stablecoin_escrow", "stablecoin", 3 * BOND_COUPON, "investor", signer="stablecoin_escrow")
+    ])
+
+    case = base_state(MATURITY_DATE)
+    case["global"]["coupons_paid"] = BOND_LENGTH
+    case["local"]["investor"]["coupons_paid"] = BOND_LENGTH
+    add("sell", case, [
+        app_call("investor", ["sell"], ["bond_escrow", "stablecoin_escrow"], fee=3000),
+        asset_transfer("bond_escrow", "bond", 3, "bond_escrow", "investor", "bond_escrow"),
+        asset_transfer("stablecoin_escrow", "stablecoin", 3 * BOND_PRINCIPAL, "investor", signer="stablecoin_escrow")
+    ])
+
+    case = base_state(MATURITY_DATE)
+    case["global"]["coupons_paid"] = BOND_LENGTH
+    case["local"]["investor"]["coupons_paid"] = BOND_LENGTH
+    case["holdings"]["stablecoin_escrow"]["stablecoin"] = 150
+    add("default", case, [
+        app_call("investor", ["default"], ["bond_escrow", "stablecoin_escrow"], fee=3000),
+        asset_transfer("bond_escrow", "bond", 3, "bond_escrow", "investor", "bond_escrow"),
+        asset_transfer("stablecoin_escrow", "stablecoin", 150, "investor", signer="stablecoin_escrow")
+    ])
+
+    add("set_trade", base_state(END_BUY_DATE + 1), [app_call("investor", ["set_trade", 3])])
+    add("freeze", base_state(END_BUY_DATE + 1), [app_call("regulator", ["freeze", 0], ["investor"])])
+    add("freeze_all", base_state(END_BUY_DATE + 1), [app_call("regulator", ["freeze_all", 1])])
+    add("rate", base_state(END_BUY_DATE + 1), [app_call("verifier", ["rate", 4])])
+    add("advance_time", base_state(END_BUY_DATE + 1), [app_call("investor", ["advance_time", END_BUY_DATE + 2])])
+
+    for escrow, asset in [("bond_escrow", "bond"), ("stablecoin_escrow", "stablecoin")]:
+        add(escrow + "_opt_in", base_state(0), [
+            asset_transfer(escrow, asset, 0, escrow, signer=escrow, fee=1000)
+        ])
+
+    return cases
+
+
+# MUTATIONS: each takes (rng, case) and mutates case in place
+
+def _amount(rng, value):
+    return rng.choice([0, 1, value - 1, value + 1, value * 2, MAX_UINT64, rng.randrange(1 << rng.choice([8, 32, 64]))])
+
+
+def _uint(value):
+    return min(max(value, 0), MAX_UINT64)
+
+
+def mutate_group_size(rng, case):
+    txns = case["txns"]
+    op = rng.randrange(4)
+    if op == 0 and len(txns) > 1:
+        del txns[rng.randrange(1, len(txns))]
+    elif op == 1 and len(txns) < 16:
+        txns.append(payment(rng.choice(PEOPLE), rng.choice(ACTORS), rng.randrange(1000)))
+    elif op == 2 and len(txns) < 16:
+        txns.insert(rng.randrange(len(txns) + 1), copy.deepcopy(rng.choice(txns)))
+    elif len(txns) > 1:
+        i, j = rng.sample(range(len(txns)), 2)
+        txns[i], txns[j] = txns[j], txns[i]
+
+
+def mutate_asset_amount(rng, case):
+    txns = [t for t in case["txns"] if t["type"] != "appl"]
+    if txns:
+        txn = rng.choice(txns)
+        txn["amount"] = _uint(_amount(rng, txn["amount"]))
+
+
+def mutate_accounts(rng, case):
+    txns = [t for t in case["txns"] if t["type"] == "appl"]
+    if not txns:
+        return
+    accounts = rng.choice(txns)["accounts"]
+    op = rng.randrange(4)
+    if op == 0 and accounts:
+        accounts[rng.randrange(len(accounts))] = rng.choice(ACTORS)
+    elif op == 1 and accounts:
+        del accounts[rng.randrange(len(accounts))]
+    elif op == 2 and len(accounts) < 4:
+        accounts.append(rng.choice(ACTORS))
+    else:
+        rng.shuffle(accounts)
+
+
+def mutate_rekey_to(rng, case):
+    rng.choice(case["txns"])["rekey_to"] = rng.choice(ACTORS)
+
+
+def mutate_address(rng, case):
+    txn = rng.choice(case["txns"])
+    field = rng.choice([f for f in ["sender", "receiver", "asset_sender", "close_to"] if f in txn])
+    txn[field] = rng.choice(ACTORS)
+
+
+def mutate_fee(rng, case):
+    txn = rng.choice(case["txns"])
+    txn["fee"] = rng.choice([0, 1000, 1001, 2000, 4000])
+
+
+def mutate_last_valid(rng, case):
+    txn = rng.choice(case["txns"])
+    txn["last_valid"] = rng.choice([1000, LV - 1, LV, LV + 1])
+
+
+def mutate_args(rng, case):
+    txns = [t for t in case["txns"] if t["type"] == "appl"]
+    if not txns:
+        return
+    args = rng.choice(txns)["args"]
+    if rng.randrange(2) and args:
+        args[0] = rng.choice(HANDLERS + [0, "x" * 9])
+    elif len(args) > 1:
+        args[1] = rng.choice([0, 1, 5, 6, args[1] + 1 if isinstance(args[1], int) else 0, MAX_UINT64, "x" * 9])
+    elif rng.randrange(2):
+        args.append(rng.randrange(10))
+    elif args:
+        args.pop()
+
+
+def mutate_time(rng, case):
+    time = _uint(rng.choice(INTERESTING_TIMES) + rng.choice([-1, 0, 1]))
+    if rng.randrange(4):
+        case["timestamp"] = time
+    elif "time" in case["global"]:
+        del case["global"]["time"]
+    else:
+        case["global"]["time"] = time
+
+
+def mutate_signer(rng, case):
+    rng.choice(case["txns"])["signer"] = rng.choice(SIGNERS)
+
+
+def mutate_state(rng, case):
+    op = rng.randrange(4)
+    if op == 0 and case["local"]:
+        local = case["local"][rng.choice(sorted(case["local"]))]
+        key = rng.choice(["frozen", "trade", "coupons_paid"])
+        local[key] = _uint(_amount(rng, local.get(key, 0)))
+    elif op == 1:
+        key = rng.choice(["coupons_paid", "reserve", "frozen"])
+        case["global"][key] = _uint(_amount(rng, case["global"][key]))
+    elif op == 2:
+        holding = case["holdings"].setdefault(rng.choice(PEOPLE + ESCROWS), {})
+        asset = rng.choice(["bond", "stablecoin"])
+        holding[asset] = _uint(_amount(rng, holding.get(asset, 0)))
+    else:
+        actor = rng.choice(PEOPLE + ESCROWS)
+        if actor in case["local"]:
+            del case["local"][actor]
+        else:
+            case["local"][actor] = {"frozen": 1}
+
+
+MUTATIONS = [
+    mutate_group_size, mutate_asset_amount, mutate_accounts, mutate_rekey_to, mutate_address,
+    mutate_fee, mutate_last_valid, mutate_args, mutate_time, mutate_signer, mutate_state
+]
+
+
+def mutate(rng, case, max_mutations=4):
+    case = copy.deepcopy(case)
+    for _ in range(1 + rng.randrange(max_mutations)):
+        rng.choice(MUTATIONS)(rng, case)
+    return case
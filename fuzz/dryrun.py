@@ -0,0 +1,172 @@
+import base64
+import hashlib
+import os
+import sys
+
+from algosdk.encoding import decode_address, encode_address
+from algosdk.future import transaction
+from algosdk.v2client import algod
+from algosdk.v2client.models import (
+    Account, Application, ApplicationLocalState, ApplicationParams, ApplicationStateSchema, Asset,
+    AssetHolding, AssetParams, DryrunRequest, TealKeyValue, TealValue
+)
+from pyteal import compileTeal, Mode
+
+from fuzz.cases import APP_ID, BOND_ID, STABLECOIN_ID, LV, TRADE_PRICE, PEOPLE, MAX_UINT64
+from fuzz.model import ASSET_IDS, programs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets"))
+
+import bondEscrow  # noqa: E402
+import clear  # noqa: E402
+import stablecoinEscrow  # noqa: E402
+import stateful  # noqa: E402
+import tradeLsig  # noqa: E402
+
+ZERO_ADDRESS = encode_address(bytes(32))
+GENESIS_HASH = base64.b64encode(bytes(32)).decode()
+
+
+def compile_programs(client):
+    """Returns {program name: (program bytes, address)} compiled by algod"""
+    sources = {
+        "stateful": compileTeal(stateful.contract(STABLECOIN_ID), Mode.Application, version=4),
+        "clear": compileTeal(clear.contract(), Mode.Application, version=2),
+        "bondEscrow": compileTeal(bondEscrow.contract(APP_ID, BOND_ID, LV), Mode.Signature, version=4),
+        "stablecoinEscrow": compileTeal(stablecoinEscrow.contract(APP_ID, STABLECOIN_ID, LV), Mode.Signature, version=4),
+        "tradeLsig": compileTeal(
+            tradeLsig.contract(APP_ID, STABLECOIN_ID, BOND_ID, LV, TRADE_PRICE), Mode.Signature, version=4
+        )
+    }
+    compiled = {}
+    for name, source in sources.items():
+        response = client.compile(source)
+        compiled[name] = (base64.b64decode(response["result"]), response["hash"])
+    return compiled
+
+
+class Dryrun:
+    """Runs cases against the compiled TEAL through the algod dryrun endpoint"""
+
+    def __init__(self, algod_address, algod_token, compiled):
+        self.client = algod.AlgodClient(algod_token, algod_address)
+        self.compiled = compiled
+        self.addresses = {"zero": ZERO_ADDRESS}
+        for name in PEOPLE:
+            self.addresses[name] = encode_address(hashlib.sha256(b"algo-green-bond/" + name.encode()).digest())
+        self.addresses["bond_escrow"] = compiled["bondEscrow"][1]
+        self.addresses["stablecoin_escrow"] = compiled["stablecoinEscrow"][1]
+
+    def run(self, case):
+        """Returns ({"<txn index>:<program>": approved}, set of (program, pc) executed)"""
+        response = self.client.dryrun(self.request(case))
+        if response.get("error"):
+            raise RuntimeError(response["error"])
+        verdicts = {}
+        coverage = set()
+        for i, (txn, result) in enumerate(zip(case["txns"], response["txns"])):
+            for program in programs(txn):
+                mode = "app-call" if program == "stateful" else "logic-sig"
+                verdicts["%d:%s" % (i, program)] = "PASS" in (result.get(mode + "-messages") or [])
+                coverage.update((program, line["pc"]) for line in result.get(mode + "-trace") or [])
+        return verdicts, coverage
+
+    def request(self, case):
+        txns = [self.transaction(txn) for txn in case["txns"]]
+        transaction.assign_group_id(txns)
+        signed = [self.sign(txn, spec) for txn, spec in zip(txns, case["txns"])]
+        return DryrunRequest(
+            txns=signed,
+            accounts=self.accounts(case),
+            apps=[self.application(case)],
+            round=1,
+            latest_timestamp=case["timestamp"]
+        )
+
+    def transaction(self, spec):
+        sp = transaction.SuggestedParams(spec["fee"], 1, spec["last_valid"], GENESIS_HASH, flat_fee=True)
+        sender = self.addresses[spec["sender"]]
+        rekey_to = self.address_or_none(spec["rekey_to"])
+        if spec["type"] == "appl":
+            return transaction.ApplicationNoOpTxn(
+                sender, sp, APP_ID,
+                app_args=[arg.encode() if isinstance(arg, str) else arg.to_bytes(8, "big") for arg in spec["args"]],
+                accounts=[self.addresses[account] for account in spec["accounts"]],
+                foreign_assets=[BOND_ID, STABLECOIN_ID],
+                rekey_to=rekey_to
+            )
+        if spec["type"] == "axfer":
+            return transaction.AssetTransferTxn(
+                sender, sp, self.addresses[spec["receiver"]], spec["amount"], ASSET_IDS[spec["asset"]],
+                close_assets_to=self.address_or_none(spec["close_to"]),
+                revocation_target=self.address_or_none(spec["asset_sender"]),
+                rekey_to=rekey_to
+            )
+        return transaction.PaymentTxn(sender, sp, self.addresses[spec["receiver"]], spec["amount"], rekey_to=rekey_to)
+
+    def sign(self, txn, spec):
+        # dryrun does not verify signatures so none are made
+        if spec["signer"] == "sk":
+            return transaction.SignedTransaction(txn, None)
+        if spec["signer"] == "trade_lsig":
+            lsig = transaction.LogicSig(self.compiled["tradeLsig"][0])
+            lsig.sig = base64.b64encode(bytes(64)).decode()
+            return transaction.LogicSigTransaction(txn, lsig)
+        program = {"bond_escrow": "bondEscrow", "stablecoin_escrow": "stablecoinEscrow"}[spec["signer"]]
+        return transaction.LogicSigTransaction(txn, transaction.LogicSig(self.compiled[program][0]))
+
+    def address_or_none(self, actor):
+        return None if actor == "zero" else self.addresses[actor]
+
+    def accounts(self, case):
+        accounts = []
+        for actor, address in self.addresses.items():
+            if actor == "zero":
+                continue
+            local = case["local"].get(actor)
+            holdings = case["holdings"].get(actor, {})
+            account = Account(
+                address=address,
+                amount=10 ** 9,
+                status="Offline",
+                assets=[AssetHolding(amount, ASSET_IDS[asset], self.addresses["master"], False)
+                        for asset, amount in sorted(holdings.items())],
+                apps_local_state=None if local is None else [ApplicationLocalState(
+                    id=APP_ID,
+                    schema=ApplicationStateSchema(num_uint=8, num_byte_slice=8),
+                    key_value=[self.key_value(key, value) for key, value in sorted(local.items())]
+                )]
+            )
+            if actor == "master":
+                account.created_assets = [
+                    Asset(BOND_ID, AssetParams(creator=address, decimals=0, total=case["bond_total"])),
+                    Asset(STABLECOIN_ID, AssetParams(creator=address, decimals=6, total=MAX_UINT64))
+                ]
+            accounts.append(account)
+        return accounts
+
+    def application(self, case):
+        global_state = []
+        for key, value in sorted(case["global"].items()):
+            if key.endswith("_addr"):
+                value = decode_address(self.addresses[value])
+            elif key == "ratings":
+                value = bytes.fromhex(value)
+            global_state.append(self.key_value(key, value))
+        return Application(APP_ID, ApplicationParams(
+            creator=self.addresses["master"],
+            approval_program=self.compiled["stateful"][0],
+            clear_state_program=self.compiled["clear"][0],
+            local_state_schema=ApplicationStateSchema(num_uint=8, num_byte_slice=8),
+            global_state_schema=ApplicationStateSchema(num_uint=32, num_byte_slice=32),
+            global_state=global_state
+        ))
+
+    @staticmethod
+    def key_value(key, value):
+        if isinstance(value, bytes):
+            teal_value = TealValue(type=1, bytes=base64.b64encode(value).decode())
+        else:
+            teal_value = TealValue(type=2, uint=value)
+        return TealKeyValue(key=base64.b64encode(key.encode()).decode(), value=teal_value)
+
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import time
+
+from fuzz.cases import mutate, seeds
+from fuzz.dryrun import Dryrun
+from fuzz.model import Model
+
+# Worker process state, set by init_worker
+_dryrun = None
+
+# Parts of error messages which differ between runs of the same crash, most specific first
+VARIABLE = [
+    (re.compile(r"\b[A-Z2-7]{58}\b"), "<address>"),
+    (re.compile(r"\b[A-Z2-7]{52}\b"), "<txid>"),
+    (re.compile(r"\b(0x)?[0-9a-fA-F]{16,}\b"), "<hex>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+
+# Mutated cases submitted to the pool at a time, so a run given a duration overshoots it by at most one batch
+BATCH_SIZE = 1024
+
+
+def init_worker(algod_address, algod_token, compiled):
+    global _dryrun
+    _dryrun = Dryrun(algod_address, algod_token, compiled)
+
+
+def run_job(job):
+    """Mutates case (unless seed is None) and runs it against both the model and the TEAL"""
+    case, seed, max_mutations = job
+    if seed is not None:
+        case = mutate(random.Random(seed), case, max_mutations)
+    result = {"case": case, "model": Model(case).run()}
+    try:
+        result["teal"], coverage = _dryrun.run(case)
+        result["coverage"] = sorted(coverage)
+    except Exception as e:
+        result["error"] = repr(e)
+    return result
+
+
+def case_hash(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def normalize_error(error):
+    for pattern, replacement in VARIABLE:
+        error = pattern.sub(replacement, error)
+    return error
+
+
+def crash_signature(result):
+    if "error" in result:
+        return ["error", normalize_error(result["error"])]
+    args = [txn["args"][:1] for txn in result["case"]["txns"] if txn["type"] == "appl"]
+    diff = sorted(
+        [key, result["model"].get(key), result["teal"].get(key)]
+        for key in set(result["model"]) | set(result["teal"])
+        if result["model"].get(key) != result["teal"].get(key)
+    )
+    return ["mismatch", args[:1], diff]
+
+
+def is_crash(result):
+    return "error" in result or result["model"] != result["teal"]
+
+
+class Fuzzer:
+
+    def __init__(self, pool, corpus_dir, crash_dir, seed=None, max_mutations=4):
+        self.pool = pool
+        self.corpus_dir = corpus_dir
+        self.crash_dir = crash_dir
+        self.rng = random.Random(seed)
+        self.max_mutations = max_mutations
+        self.coverage = set()
+        self.crashes = 0
+        os.makedirs(corpus_dir, exist_ok=True)
+        os.makedirs(crash_dir, exist_ok=True)
+        self.corpus = load_dir(corpus_dir) or seeds()
+
+    def run_cases(self, cases):
+        """Runs cases unmutated, returning results in same order"""
+        return self.pool.map(run_job, [(case, None, 0) for case in cases])
+
+    def replay_crashes(self):
+        """Re-runs persisted crashes, returning those which still reproduce"""
+        crashes = load_dir(self.crash_dir)
+        return [result for result in self.run_cases([crash["case"] for crash in crashes]) if is_crash(result)]
+
+    def fuzz(self, num_cases=None, duration=None, report_every=10):
+        for result in self.run_cases(self.corpus):
+            if is_crash(result):
+                self.save_crash(result)
+            else:
+                self.coverage.update(map(tuple, result["coverage"]))
+
+        start = last_report = time.time()
+        executed = 0
+        # jobs go to the pool in batches, checking the deadline between them, as the pool reads an iterable of jobs
+        # to its end before taking any later call (e.g. from minimize)
+        while (num_cases is None or executed < num_cases) and (duration is None or time.time() - start < duration):
+            size = BATCH_SIZE if num_cases is None else min(BATCH_SIZE, num_cases - executed)
+            jobs = [(self.rng.choice(self.corpus), self.rng.getrandbits(64), self.max_mutations) for _ in range(size)]
+            for result in self.pool.imap_unordered(run_job, jobs, chunksize=16):
+                executed += 1
+                self.handle(result)
+                now = time.time()
+                if now - last_report >= report_every:
+                    last_report = now
+                    self.report(executed, now - start)
+        self.report(executed, time.time() - start)
+        return executed
+
+    def handle(self, result):
+        case = result["case"]
+        if is_crash(result):
+            self.save_crash(result)
+            return
+        new_coverage = set(map(tuple, result["coverage"])) - self.coverage
+        if new_coverage:
+            self.coverage |= new_coverage
+            self.corpus.append(case)
+            save(os.path.join(self.corpus_dir, case_hash(case) + ".json"), case)
+
+    def save_crash(self, result):
+        signature = crash_signature(result)
+        path = os.path.join(self.crash_dir, case_hash(signature) + ".json")
+        # keep the smallest group seen for each distinct crash
+        if os.path.exists(path):
+            with open(path) as f:
+                if len(json.load(f)["case"]["txns"]) <= len(result["case"]["txns"]):
+                    return
+        else:
+            self.crashes += 1
+        save(path, {"signature": signature, **result})
+
+    def minimize(self):
+        """Reduces the corpus to a subset of cases with the same coverage, removing the rest from disk"""
+        results = self.run_cases(self.corpus)
+        results = sorted(
+            (r for r in results if not is_crash(r)),
+            key=lambda r: (-len(r["coverage"]), len(r["case"]["txns"]))
+        )
+        covered = set()
+        kept = []
+        for result in results:
+            coverage = set(map(tuple, result["coverage"]))
+            if not coverage <= covered:
+                covered |= coverage
+                kept.append(result["case"])
+        names = {case_hash(case) + ".json" for case in kept}
+        for name in os.listdir(self.corpus_dir):
+            if name.endswith(".json") and name not in names:
+                os.remove(os.path.join(self.corpus_dir, name))
+        for case in kept:
+            save(os.path.join(self.corpus_dir, case_hash(case) + ".json"), case)
+        before = len(self.corpus)
+        self.corpus = kept
+        self.coverage = covered
+        return before, len(kept)
+
+    def report(self, executed, elapsed):
+        print("cases %d (%d/s) corpus %d coverage %d crashes %d" % (
+            executed, executed / max(elapsed, 1e-9), len(self.corpus), len(self.coverage), self.crashes
+        ), flush=True)
+
+
+def load_dir(path):
+    cases = []
+    for name in sorted(os.listdir(path)) if os.path.isdir(path) else []:
+        if name.endswith(".json"):
+            with open(os.path.join(path, name)) as f:
+                cases.append(json.load(f))
+    return cases
+
+
+def save(path, value):
+    with open(path, "w") as f:
+        json.dump(value, f, indent=1, sort_keys=True)
+
+
+def make_pool(processes, algod_address, algod_token, compiled):
+    return multiprocessing.Pool(processes, init_worker, (algod_address, algod_token, compiled))
@@ -0,0 +1,434 @@
+import copy
+
+from fuzz.cases import APP_ID, BOND_ID, STABLECOIN_ID, LV, TRADE_PRICE, MAX_UINT64
+
+# Reference model of the intended semantics of the contracts in assets/.
+# Programs either approve or fail, so errors (overflow, missing account etc.) are treated as rejections.
+
+ASSET_IDS = {"bond": BOND_ID, "stablecoin": STABLECOIN_ID}
+TXN_TYPES = {"pay": 1, "axfer": 4, "appl": 6}
+MULTIPLIERS = {5: 10000, 4: 11000, 3: 12100, 2: 13310, 1: 14641, 0: 10000}
+
+
+class Reject(Exception):
+    pass
+
+
+def check(cond):
+    if not cond:
+        raise Reject()
+
+
+def add(a, b):
+    check(a + b <= MAX_UINT64)
+    return a + b
+
+
+def sub(a, b):
+    check(a >= b)
+    return a - b
+
+
+def mul(a, b):
+    check(a * b <= MAX_UINT64)
+    return a * b
+
+
+def div(a, b):
+    check(b != 0)
+    return a // b
+
+
+def btoi(arg):
+    if isinstance(arg, int):
+        return arg
+    check(len(arg.encode()) <= 8)
+    return int.from_bytes(arg.encode(), "big")
+
+
+def programs(txn):
+    """Returns names of programs which are evaluated for txn"""
+    names = []
+    if txn["signer"] != "sk":
+        names.append({
+            "bond_escrow": "bondEscrow",
+            "stablecoin_escrow": "stablecoinEscrow",
+            "trade_lsig": "tradeLsig"
+        }[txn["signer"]])
+    if txn["type"] == "appl":
+        names.append("stateful")
+    return names
+
+
+class Gtxn:
+    """Field access on a group transaction with the defaults TEAL uses for fields of other types"""
+
+    def __init__(self, txn):
+        self.txn = txn
+
+    def get(self, field):
+        return self.txn.get(field, 0 if field in ("amount", "asset") else "zero")
+
+    def type_enum(self):
+        return TXN_TYPES[self.txn["type"]]
+
+    def xfer_asset(self):
+        return ASSET_IDS[self.txn["asset"]] if self.txn["type"] == "axfer" else 0
+
+    def asset_amount(self):
+        return self.txn["amount"] if self.txn["type"] == "axfer" else 0
+
+    def asset_receiver(self):
+        return self.txn["receiver"] if self.txn["type"] == "axfer" else "zero"
+
+    def application_id(self):
+        return APP_ID if self.txn["type"] == "appl" else 0
+
+    def arg(self, i):
+        args = self.txn.get("args", [])
+        check(i < len(args))
+        return args[i]
+
+    def account(self, i):
+        # accounts[0] is the sender
+        if i == 0:
+            return self.txn["sender"]
+        accounts = self.txn.get("accounts", [])
+        check(i <= len(accounts))
+        return accounts[i - 1]
+
+
+class Model:
+
+    def __init__(self, case):
+        self.case = case
+        self.txns = case["txns"]
+        self.glob = copy.deepcopy(case["global"])
+        self.local = copy.deepcopy(case["local"])
+
+    def run(self):
+        """Returns {"<txn index>:<program>": approved} for every program evaluated in the group"""
+        verdicts = {}
+        for i, txn in enumerate(self.txns):
+            for program in programs(txn):
+                # state changes of a rejected program are discarded
+                snapshot = copy.deepcopy((self.glob, self.local))
+                try:
+                    getattr(self, "eval_" + program)(i)
+                    verdicts["%d:%s" % (i, program)] = True
+                except Reject:
+                    self.glob, self.local = snapshot
+                    verdicts["%d:%s" % (i, program)] = False
+        return verdicts
+
+    # HELPERS
+
+    def gtxn(self, i):
+        check(i < len(self.txns))
+        return Gtxn(self.txns[i])
+
+    def group_size(self):
+        return len(self.txns)
+
+    def time(self):
+        return self.glob.get("time", self.case["timestamp"])
+
+    def global_int(self, key):
+        value = self.glob.get(key, 0)
+        check(isinstance(value, int))
+        return value
+
+    def local_get(self, index, key):
+        actor = self.app_txn.account(index)
+        check(actor in self.local)
+        return self.local[actor].get(key, 0)
+
+    def local_put(self, index, key, value):
+        actor = self.app_txn.account(index)
+        check(actor in self.local)
+        self.local[actor][key] = value
+
+    def local_del(self, index, key):
+        actor = self.app_txn.account(index)
+        check(actor in self.local)
+        self.local[actor].pop(key, None)
+
+    def balance(self, index, asset):
+        actor = self.app_txn.account(index)
+        return self.case["holdings"].get(actor, {}).get(asset, 0)
+
+    def period(self):
+        return div(
+            sub(self.global_int("maturity_date"), self.global_int("end_buy_date")),
+            self.global_int("bond_length")
+        )
+
+    def rating_round(self, time):
+        if time < self.global_int("end_buy_date"):
+            return 0
+        check(time <= self.global_int("maturity_date"))
+        return add(div(time - self.global_int("end_buy_date"), self.period()), 1)
+
+    def coupon_rounds(self, time):
+        if time < self.global_int("end_buy_date"):
+            return 0
+        if time > self.global_int("maturity_date"):
+            return self.global_int("bond_length")
+        return div(time - self.global_int("end_buy_date"), self.period())
+
+    def ratings(self):
+        return bytearray.fromhex(self.glob["ratings"])
+
+    def num_bonds_in_circ(self):
+        return sub(self.case["bond_total"], self.balance(1, "bond"))
+
+    # STATEFUL
+
+    def eval_stateful(self, i):
+        self.app_txn = self.gtxn(i)
+        check(i == 0)
+        arg = self.app_txn.arg(0)
+        handler = arg if isinstance(arg, str) else None
+        if handler in ("advance_time", "set_trade", "freeze", "freeze_all", "rate"):
+            return getattr(self, "on_" + handler)()
+        check(self.global_int("frozen") > 0)
+        check(self.local_get(0, "frozen") > 0)
+        check(handler in ("buy", "trade", "trade_coupon", "coupon", "sell", "default"))
+        getattr(self, "on_" + handler)()
+
+    def on_advance_time(self):
+        check(self.group_size() == 1)
+        new_time = btoi(self.app_txn.arg(1))
+        if "time" in self.glob:
+            check(new_time > self.glob["time"])
+        else:
+            check(new_time > self.case["timestamp"])
+        self.glob["time"] = new_time
+
+    def on_set_trade(self):
+        check(self.group_size() == 1)
+        self.local_put(0, "trade", btoi(self.app_txn.arg(1)))
+
+    def on_freeze(self):
+        check(self.group_size() == 1)
+        check(self.app_txn.account(0) == self.glob["financial_regulator_addr"])
+        self.local_put(1, "frozen", btoi(self.app_txn.arg(1)))
+
+    def on_freeze_all(self):
+        check(self.group_size() == 1)
+        check(self.app_txn.account(0) == self.glob["financial_regulator_addr"])
+        self.glob["frozen"] = btoi(self.app_txn.arg(1))
+
+    def on_rate(self):
+        check(self.group_size() == 1)
+        rating = btoi(self.app_txn.arg(1))
+        check(1 <= rating <= 5)
+        check(self.app_txn.account(0) == self.glob["green_verifier_addr"])
+        ratings = self.ratings()
+        index = self.rating_round(self.time())
+        check(index < len(ratings))
+        ratings[index] = rating
+        self.glob["ratings"] = ratings.hex()
+
+    def on_buy(self):
+        check(self.group_size() == 3)
+        g0, g1, g2 = self.gtxn(0), self.gtxn(1), self.gtxn(2)
+        cost = mul(g1.asset_amount(), self.global_int("bond_cost"))
+        check(g1.get("sender") == self.glob["bond_escrow_addr"])
+        check(g1.get("asset_sender") == g1.get("sender"))
+        check(g1.asset_receiver() == g0.get("sender"))
+        check(g2.type_enum() == TXN_TYPES["axfer"])
+        check(g2.get("sender") == g0.get("sender"))
+        check(g2.asset_receiver() == self.glob["issuer_addr"])
+        check(g2.xfer_asset() == STABLECOIN_ID)
+        check(g2.asset_amount() == cost)
+        check(self.global_int("start_buy_date") <= self.time() <= self.global_int("end_buy_date"))
+
+    def update_trade(self):
+        self.local_put(0, "trade", sub(self.local_get(0, "trade"), self.gtxn(1).asset_amount()))
+
+    def on_trade(self):
+        check(self.group_size() >= 2)
+        g0, g1 = self.gtxn(0), self.gtxn(1)
+        check(g1.get("sender") == self.glob["bond_escrow_addr"])
+        check(g1.get("asset_sender") == g0.get("sender"))
+        check(g1.asset_receiver() == g0.account(1))
+        check(self.time() > self.global_int("end_buy_date"))
+        check(self.local_get(1, "frozen") != 0)
+        if self.balance(1, "bond") > 0:
+            check(self.local_get(0, "coupons_paid") == self.local_get(1, "coupons_paid"))
+        else:
+            self.local_put(1, "coupons_paid", self.local_get(0, "coupons_paid"))
+        self.update_trade()
+
+    def coupon_setup(self, holder):
+        """Returns (coupon value, stablecoin owed to holder)"""
+        ratings = self.ratings()
+        index = add(self.local_get(holder, "coupons_paid"), 1)
+        check(index < len(ratings))
+        check(ratings[index] in MULTIPLIERS)
+        value = div(mul(self.global_int("bond_coupon"), MULTIPLIERS[ratings[index]]), 10000)
+        return value, mul(value, self.balance(holder, "bond"))
+
+    def coupon_update(self, holder, value, transfer):
+        coupons_paid = self.local_get(holder, "coupons_paid")
+        check(coupons_paid < self.coupon_rounds(self.time()))
+        self.local_put(holder, "coupons_paid", add(coupons_paid, 1))
+        if self.local_get(holder, "coupons_paid") > self.global_int("coupons_paid"):
+            self.glob["coupons_paid"] = add(self.global_int("coupons_paid"), 1)
+            reserve = add(self.global_int("reserve"), mul(self.num_bonds_in_circ(), value))
+            self.glob["reserve"] = reserve
+            check(reserve <= self.balance(2, "stablecoin"))
+        self.glob["reserve"] = sub(self.global_int("reserve"), transfer)
+
+    def check_escrow_accounts(self):
+        check(self.app_txn.account(1) == self.glob["bond_escrow_addr"])
+        check(self.app_txn.account(2) == self.glob["stablecoin_escrow_addr"])
+
+    def on_coupon(self):
+        check(self.group_size() == 2)
+        self.check_escrow_accounts()
+        value, transfer = self.coupon_setup(0)
+        g0, g1 = self.gtxn(0), self.gtxn(1)
+        check(g1.get("sender") == self.glob["stablecoin_escrow_addr"])
+        check(g1.asset_receiver() == g0.get("sender"))
+        check(g1.asset_amount() == transfer)
+        self.coupon_update(0, value, transfer)
+
+    def on_trade_coupon(self):
+        check(self.group_size() >= 3)
+        self.check_escrow_accounts()
+        check(self.balance(3, "bond") > 0)
+        holder = 0 if self.local_get(0, "coupons_paid") < self.local_get(3, "coupons_paid") else 3
+        value, transfer = self.coupon_setup(holder)
+        g0, g1, g2 = self.gtxn(0), self.gtxn(1), self.gtxn(2)
+        check(g1.get("sender") == self.glob["bond_escrow_addr"])
+        check(g1.get("asset_sender") == g0.get("sender"))
+        check(g1.asset_receiver() == g0.account(3))
+        check(g2.get("sender") == self.glob["stablecoin_escrow_addr"])
+        check(g2.asset_receiver() == g0.account(holder))
+        check(g2.asset_amount() == transfer)
+        check(self.time() > self.global_int("end_buy_date"))
+        check(self.local_get(3, "frozen") != 0)
+        self.coupon_update(holder, value, transfer)
+        check(self.local_get(0, "coupons_paid") == self.local_get(3, "coupons_paid"))
+        self.update_trade()
+
+    def check_bond_return(self):
+        g0, g1 = self.gtxn(0), self.gtxn(1)
+        check(g1.get("sender") == self.glob["bond_escrow_addr"])
+        check(g1.get("asset_sender") == g0.get("sender"))
+        check(g1.asset_receiver() == g1.get("sender"))
+        check(g1.asset_amount() == self.balance(0, "bond"))
+        g2 = self.gtxn(2)
+        check(g2.get("sender") == self.glob["stablecoin_escrow_addr"])
+        check(g2.asset_receiver() == g0.get("sender"))
+
+    def on_sell(self):
+        check(self.group_size() == 3)
+        check(self.time() >= self.global_int("maturity_date"))
+        self.check_escrow_accounts()
+        self.check_bond_return()
+        check(self.gtxn(2).asset_amount() == mul(self.gtxn(1).asset_amount(), self.global_int("bond_principal")))
+        collected_all = [
+            self.global_int("bond_length") == self.local_get(0, "coupons_paid"),
+            self.global_int("bond_coupon") == 0
+        ]
+        check(any(collected_all))
+        owed = add(self.global_int("reserve"), mul(self.num_bonds_in_circ(), self.global_int("bond_principal")))
+        check(owed <= self.balance(2, "stablecoin"))
+        self.local_del(0, "coupons_paid")
+
+    def on_default(self):
+        check(self.group_size() == 3)
+        self.check_escrow_accounts()
+        self.check_bond_return()
+        stablecoin_balance = self.balance(2, "stablecoin")
+        owed_to_sender = div(
+            mul(sub(stablecoin_balance, self.global_int("reserve")), self.balance(0, "bond")),
+            self.num_bonds_in_circ()
+        )
+        check(self.gtxn(2).asset_amount() == owed_to_sender)
+        check(self.local_get(0, "coupons_paid") == self.global_int("coupons_paid"))
+        owed = self.global_int("reserve")
+        if self.time() >= self.global_int("maturity_date"):
+            owed = add(owed, mul(self.num_bonds_in_circ(), self.global_int("bond_principal")))
+        check(owed > stablecoin_balance)
+        self.local_del(0, "coupons_paid")
+
+    # STATELESS
+
+    def escrow_common(self, i, asset):
+        txn = self.gtxn(i)
+        check(txn.type_enum() == TXN_TYPES["axfer"])
+        check(txn.get("close_to") == "zero")
+        check(txn.get("rekey_to") == "zero")
+        if self.group_size() == 1:
+            check(txn.asset_amount() == 0)
+            check(txn.get("fee") <= 1000)
+            check(txn.xfer_asset() == ASSET_IDS[asset])
+            check(txn.get("last_valid") < LV)
+            check(txn.get("asset_sender") == "zero")
+            return None
+        check(txn.get("fee") == 0)
+        g0 = self.gtxn(0)
+        check(g0.type_enum() == TXN_TYPES["appl"])
+        check(g0.application_id() == APP_ID)
+        return g0
+
+    def eval_bondEscrow(self, i):
+        g0 = self.escrow_common(i, "bond")
+        if g0 is None:
+            return
+        g1 = self.gtxn(1)
+        check(i == 1)
+        check(g1.type_enum() == TXN_TYPES["axfer"])
+        check(g1.xfer_asset() == BOND_ID)
+        group_size = {
+            "buy": lambda n: n == 3,
+            "trade": lambda n: n >= 2,
+            "trade_coupon": lambda n: n >= 3,
+            "sell": lambda n: n == 3,
+            "default": lambda n: n == 3
+        }
+        arg = g0.arg(0)
+        check(arg in group_size)
+        check(group_size[arg](self.group_size()))
+
+    def eval_stablecoinEscrow(self, i):
+        check(self.gtxn(i).get("asset_sender") == "zero")
+        g0 = self.escrow_common(i, "stablecoin")
+        if g0 is None:
+            return
+        transfer_index = {
+            "coupon": (lambda n: n == 2, 1),
+            "trade_coupon": (lambda n: n >= 3, 2),
+            "sell": (lambda n: n == 3, 2),
+            "default": (lambda n: n == 3, 2)
+        }
+        arg = g0.arg(0)
+        check(arg in transfer_index)
+        group_size, index = transfer_index[arg]
+        check(group_size(self.group_size()))
+        check(i == index)
+        check(self.gtxn(index).type_enum() == TXN_TYPES["axfer"])
+        check(self.gtxn(index).xfer_asset() == STABLECOIN_ID)
+
+    def eval_tradeLsig(self, i):
+        g0, g1 = self.gtxn(0), self.gtxn(1)
+        arg = g0.arg(0)
+        check(g0.type_enum() == TXN_TYPES["appl"])
+        check(g0.application_id() == APP_ID)
+        check(arg in ("trade", "trade_coupon"))
+        check(g0.get("fee") <= 1000)
+        check(g0.get("rekey_to") == "zero")
+        check(self.gtxn(i).get("fee") <= 1000)
+        check(g1.type_enum() == TXN_TYPES["axfer"])
+        check(g1.xfer_asset() == BOND_ID)
+        check(g1.get("last_valid") < LV)
+        payment = self.gtxn(3 if arg == "trade_coupon" else 2)
+        check(payment.type_enum() == TXN_TYPES["axfer"])
+        check(payment.xfer_asset() == STABLECOIN_ID)
+        check(payment.asset_amount() == mul(TRADE_PRICE, g1.asset_amount()))
+        check(payment.get("rekey_to") == "zero")
+        check(payment.get("close_to") == "zero")
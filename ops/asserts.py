@@ -0,0 +1,212 @@
+import bisect
+import importlib
+import linecache
+import os
+import re
+import sys
+import threading
+from contextlib import contextmanager
+
+from pyteal import Assert, TealOp, compileTeal
+
+_compiler = importlib.import_module("pyteal.compiler.compiler")
+
+# TEAL v4 opcodes with fixed size immediates (in bytes), all others have none apart from the constant blocks and push ops
+IMMEDIATES = {
+    0x21: 1,  # intc
+    0x27: 1,  # bytec
+    0x2c: 1,  # arg
+    0x31: 1,  # txn
+    0x32: 1,  # global
+    0x33: 2,  # gtxn
+    0x34: 1,  # load
+    0x35: 1,  # store
+    0x36: 2,  # txna
+    0x37: 3,  # gtxna
+    0x38: 1,  # gtxns
+    0x39: 2,  # gtxnsa
+    0x3a: 2,  # gload
+    0x3b: 1,  # gloads
+    0x3c: 1,  # gaid
+    0x40: 2,  # bnz
+    0x41: 2,  # bz
+    0x42: 2,  # b
+    0x4b: 1,  # dig
+    0x51: 2,  # substring
+    0x70: 1,  # asset_holding_get
+    0x71: 1,  # asset_params_get
+    0x88: 2,  # callsub
+}
+INTCBLOCK = 0x20
+BYTECBLOCK = 0x26
+PUSHBYTES = 0x80
+PUSHINT = 0x81
+# Control flow opcodes, compared against the TEAL to check a program was assembled from it
+CONTROL = {"err": 0x00, "bnz": 0x40, "bz": 0x41, "b": 0x42, "return": 0x43, "assert": 0x44, "callsub": 0x88, "retsub": 0x89}
+
+# record_asserts and record_ops patch pyteal for the whole process, so only one traced compile runs at a time
+_lock = threading.Lock()
+
+PC = re.compile(r"pc=(\d+)")
+TXID = re.compile(r"transaction ([A-Z2-7]{52})")
+
+# Reasons of rejections which did not come from a known Assert, most specific first
+REASONS = [
+    ("txn dead", "expired"),
+    ("already in ledger", "duplicate"),
+    ("overspend", "overspend"),
+    ("below min", "below_min_balance"),
+    ("frozen", "asset_frozen"),
+    ("not opted in", "not_opted_in"),
+    ("missing from", "not_opted_in"),
+    ("would result negative", "underflow"),
+    ("rejected by logic", "logic_sig_rejected"),
+    ("rejected by ApprovalProgram", "approval_rejected"),
+    ("assert failed", "assert_failed"),
+    ("err opcode", "err_opcode"),
+    ("logic eval error", "logic_eval_error"),
+]
+
+
+def read_varuint(program, pc):
+    value = shift = 0
+    while True:
+        byte = program[pc]
+        pc += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pc
+
+
+def instruction_pcs(program):
+    """Returns the pc of every instruction of an assembled program, after its version"""
+    _, pc = read_varuint(program, 0)
+    pcs = []
+    while pc < len(program):
+        pcs.append(pc)
+        opcode = program[pc]
+        pc += 1
+        if opcode == INTCBLOCK:
+            count, pc = read_varuint(program, pc)
+            for _ in range(count):
+                _, pc = read_varuint(program, pc)
+        elif opcode == BYTECBLOCK:
+            count, pc = read_varuint(program, pc)
+            for _ in range(count):
+                length, pc = read_varuint(program, pc)
+                pc += length
+        elif opcode == PUSHBYTES:
+            length, pc = read_varuint(program, pc)
+            pc += length
+        elif opcode == PUSHINT:
+            _, pc = read_varuint(program, pc)
+        else:
+            pc += IMMEDIATES.get(opcode, 0)
+    return pcs
+
+
+@contextmanager
+def record_asserts(locations):
+    """Records in locations the (file name, line) of each Assert created, keyed by id"""
+    init = Assert.__init__
+
+    def record(self, cond):
+        init(self, cond)
+        frame = sys._getframe(1)
+        locations[id(self)] = (frame.f_code.co_filename, frame.f_lineno)
+
+    Assert.__init__ = record
+    try:
+        yield
+    finally:
+        Assert.__init__ = init
+
+
+@contextmanager
+def record_ops(ops):
+    """Records in ops the TEAL components, in order, of the next program compiled"""
+    flatten = _compiler.flattenSubroutines
+
+    def record(*args):
+        teal = flatten(*args)
+        ops.extend(teal)
+        return teal
+
+    _compiler.flattenSubroutines = record
+    try:
+        yield
+    finally:
+        _compiler.flattenSubroutines = flatten
+
+
+def compile_traced(contract, mode, version):
+    """
+    Builds the PyTeal expression returned by contract() and compiles it, returning the TEAL and,
+    for each TEAL instruction in order, [op, (file name, line) of the Assert it checks or None].
+    """
+    locations = {}
+    components = []
+    with _lock:
+        with record_asserts(locations):
+            ast = contract()
+        with record_ops(components):
+            teal = compileTeal(ast, mode, version=version)
+    return teal, [
+        [c.assemble().split()[0], locations.get(id(c.expr)) if c.assemble() == "assert" else None]
+        for c in components if isinstance(c, TealOp)
+    ]
+
+
+class AssertMap:
+    """Maps the pcs of an assembled program to the line of the PyTeal Assert which failed there"""
+
+    def __init__(self, instructions, program):
+        pcs = instruction_pcs(program)
+        # the assembler puts constant blocks before the first instruction of the TEAL
+        skip = 0
+        while skip < len(pcs) and program[pcs[skip]] in (INTCBLOCK, BYTECBLOCK):
+            skip += 1
+        self.pcs = pcs[skip:]
+        # program was not assembled from this TEAL, e.g. app was updated since
+        self.valid = len(self.pcs) == len(instructions) and all(
+            CONTROL.get(op) == program[pc] or (op not in CONTROL and program[pc] not in CONTROL.values())
+            for pc, (op, _) in zip(self.pcs, instructions)
+        )
+        self.asserts = [location for _, location in instructions] if self.valid else []
+
+    def locate(self, pc):
+        """Returns (file name, line) of the Assert at pc, or None if there is no known Assert there"""
+        i = bisect.bisect_left(self.pcs, pc)
+        if i < len(self.asserts) and self.pcs[i] == pc:
+            return self.asserts[i]
+        return None
+
+
+def describe(location):
+    """Returns a short label, e.g. "stateful.py:339", and the source of the Assert at location"""
+    filename, line = location
+    return "%s:%d" % (os.path.basename(filename), line), linecache.getline(filename, line).strip()
+
+
+def reason(message):
+    for text, label in REASONS:
+        if text in message:
+            return label
+    return "other"
+
+
+def explain(message, programs):
+    """
+    Returns (label, source) of a rejection message, where programs maps txid to the AssertMaps of its
+    (logic sig, approval program), either of which may be None. label is the file and line of the
+    failing Assert if it could be found, else a short reason with source None.
+    """
+    txid = TXID.search(message)
+    pc = PC.search(message)
+    logic, approval = programs.get(txid.group(1), (None, None)) if txid else (None, None)
+    asserts = logic if "rejected by logic" in message else approval
+    location = asserts.locate(int(pc.group(1))) if asserts and pc else None
+    if location is None:
+        return reason(message), None
+    return describe(location)
@@ -0,0 +1,425 @@
+import base64
+import os
+import sys
+import threading
+import time
+
+from algosdk import account
+from algosdk.encoding import encode_address
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from pyteal import Mode
+
+from ops.asserts import AssertMap, compile_traced, explain
+from ops.metrics import Metrics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets"))
+
+import bondEscrow  # noqa: E402
+import stablecoinEscrow  # noqa: E402
+import stateful  # noqa: E402
+import tradeLsig  # noqa: E402
+
+# Metrics recorded
+OP_SECONDS = "bond_op_seconds"  # histogram by op and stage (build, sign, submit, confirm, total)
+OPS = "bond_ops_total"  # counter by op and result (confirmed, rejected, error)
+REJECTIONS = "bond_op_rejections_total"  # counter by op and assertion (e.g. stateful.py:339, or a reason)
+IN_FLIGHT = "bond_ops_in_flight"  # gauge by op
+COMPILE_SECONDS = "bond_compile_seconds"  # histogram by program
+CACHE = "bond_cache_requests_total"  # counter by cache (program, trade_lsig, params) and result (hit, miss)
+
+# Coupon multiplier by green rating, same as get_multiplier of stateful.py
+MULTIPLIERS = {5: 10000, 4: 11000, 3: 12100, 2: 13310, 1: 14641, 0: 10000}
+
+
+class Rejected(Exception):
+    """A group rejected by the node, with the Assert which failed if known"""
+
+    def __init__(self, op, message, assertion, source):
+        super().__init__("%s rejected at %s%s: %s" % (op, assertion, " " + source if source else "", message))
+        self.op = op
+        self.message = message
+        self.assertion = assertion
+        self.source = source
+
+
+class Compiled:
+    """Program compiled by algod, with a logic sig of it and the map from its pcs to its Asserts"""
+
+    def __init__(self, program, asserts):
+        self.program = program
+        self.lsig = transaction.LogicSig(program)
+        self.address = self.lsig.address()
+        self.asserts = asserts
+
+
+class BondClient:
+    """
+    Builds, signs and submits the group of each bond operation of stateful.py (as in fuzz/cases.py).
+    lv is the round the escrows were compiled to allow opt-ins until, which is needed to rebuild them.
+
+    For each operation the seconds taken by each stage, the number in flight, whether it was confirmed and,
+    if rejected, the Assert which failed are recorded to metrics, along with hits of the program, trade lsig
+    and suggested params caches. Recording is a few dict updates per stage so can be left on.
+    """
+
+    def __init__(self, client, app_id, stablecoin_id, lv, metrics=None, params_ttl=1.0):
+        self.client = client
+        self.app_id = app_id
+        self.stablecoin_id = stablecoin_id
+        self.lv = lv
+        self.metrics = metrics or Metrics()
+        self.params_ttl = params_ttl
+        self.lock = threading.Lock()
+        self.programs = {}
+        self.compiling = {}
+        self.trade_lsigs = {}
+        self.params_lock = threading.Lock()
+        self.params = None
+
+        app = client.application_info(app_id)["params"]
+        state = global_state(app)
+        self.bond_id = state["bond_id"]
+        self.bond_cost = state["bond_cost"]
+        self.bond_coupon = state["bond_coupon"]
+        self.bond_principal = state["bond_principal"]
+        self.issuer_addr = encode_address(state["issuer_addr"])
+        self.escrow_addrs = {
+            "bondEscrow": encode_address(state["bond_escrow_addr"]),
+            "stablecoinEscrow": encode_address(state["stablecoin_escrow_addr"])
+        }
+        self.bond_total = client.asset_info(self.bond_id)["params"]["total"]
+
+        with self.metrics.timer(COMPILE_SECONDS, program="stateful"):
+            _, instructions = compile_traced(lambda: stateful.contract(stablecoin_id), Mode.Application, 4)
+        self.approval = AssertMap(instructions, base64.b64decode(app["approval-program"]))
+
+    # OPERATIONS
+
+    def buy(self, buyer_sk, num_bonds):
+        buyer = account.address_from_private_key(buyer_sk)
+        bond_escrow = self.escrow("bondEscrow")
+
+        def build(sp):
+            return [
+                (self.app_call(sp, buyer, "buy", [], 2000), buyer_sk),
+                (self.bond_transfer(sp, bond_escrow, bond_escrow.address, buyer, num_bonds), bond_escrow),
+                (transaction.AssetTransferTxn(
+                    buyer, fee(sp, 1000), self.issuer_addr, num_bonds * self.bond_cost, self.stablecoin_id
+                ), buyer_sk)
+            ]
+        return self.execute("buy", build)
+
+    def trade(self, seller_sk, receiver, num_bonds):
+        seller = account.address_from_private_key(seller_sk)
+        bond_escrow = self.escrow("bondEscrow")
+
+        def build(sp):
+            return [
+                (self.app_call(sp, seller, "trade", [receiver], 2000), seller_sk),
+                (self.bond_transfer(sp, bond_escrow, seller, receiver, num_bonds), bond_escrow)
+            ]
+        return self.execute("trade", build)
+
+    def sign_trade(self, seller_sk, price, lv):
+        """Returns the seller's delegated tradeLsig for selling bonds at price, which expires at round lv"""
+        key = (account.address_from_private_key(seller_sk), price, lv)
+        with self.lock:
+            lsig = self.trade_lsigs.get(key)
+        self.metrics.inc(CACHE, cache="trade_lsig", result="miss" if lsig is None else "hit")
+        if lsig is None:
+            compiled = self.compiled(
+                "tradeLsig", tradeLsig.contract, self.app_id, self.stablecoin_id, self.bond_id, lv, price
+            )
+            with self.metrics.timer(OP_SECONDS, op="trade", stage="sign_lsig"):
+                lsig = transaction.LogicSig(compiled.program)
+                lsig.sign(seller_sk)
+            with self.lock:
+                self.trade_lsigs[key] = lsig
+        return lsig
+
+    def trade_lsig(self, buyer_sk, seller, seller_lsig, price, num_bonds, lv):
+        """Buys num_bonds from seller at price using the seller's lsig from sign_trade with expiry lv"""
+        buyer = account.address_from_private_key(buyer_sk)
+        bond_escrow = self.escrow("bondEscrow")
+
+        def build(sp):
+            return [
+                (self.app_call(sp, seller, "trade", [buyer], 1000), seller_lsig),
+                (self.bond_transfer(expiring(sp, lv), bond_escrow, seller, buyer, num_bonds), bond_escrow),
+                (transaction.AssetTransferTxn(
+                    buyer, fee(sp, 2000), seller, num_bonds * price, self.stablecoin_id
+                ), buyer_sk)
+            ]
+        return self.execute("trade", build)
+
+    def trade_coupon(self, sender_sk, receiver, num_bonds):
+        """Trades num_bonds to an existing owner one coupon round apart from sender, paying the lagging one's coupon"""
+        sender = account.address_from_private_key(sender_sk)
+        bond_escrow = self.escrow("bondEscrow")
+        stablecoin_escrow = self.escrow("stablecoinEscrow")
+
+        def build(sp):
+            lagging, amount = self.lagging_coupon(sender, receiver)
+            return [
+                (self.app_call(sp, sender, "trade_coupon", self.escrow_accounts() + [receiver], 3000), sender_sk),
+                (self.bond_transfer(sp, bond_escrow, sender, receiver, num_bonds), bond_escrow),
+                (self.stablecoin_transfer(sp, stablecoin_escrow, lagging, amount), stablecoin_escrow)
+            ]
+        return self.execute("trade_coupon", build)
+
+    def trade_coupon_lsig(self, buyer_sk, seller, seller_lsig, price, num_bonds, lv):
+        """trade_coupon of num_bonds from seller to buyer at price using the seller's lsig, with the payment at tx3"""
+        buyer = account.address_from_private_key(buyer_sk)
+        bond_escrow = self.escrow("bondEscrow")
+        stablecoin_escrow = self.escrow("stablecoinEscrow")
+
+        def build(sp):
+            lagging, amount = self.lagging_coupon(seller, buyer)
+            return [
+                (self.app_call(sp, seller, "trade_coupon", self.escrow_accounts() + [buyer], 1000), seller_lsig),
+                (self.bond_transfer(expiring(sp, lv), bond_escrow, seller, buyer, num_bonds), bond_escrow),
+                (self.stablecoin_transfer(sp, stablecoin_escrow, lagging, amount), stablecoin_escrow),
+                (transaction.AssetTransferTxn(
+                    buyer, fee(sp, 3000), seller, num_bonds * price, self.stablecoin_id
+                ), buyer_sk)
+            ]
+        return self.execute("trade_coupon", build)
+
+    def coupon(self, holder_sk):
+        holder = account.address_from_private_key(holder_sk)
+        stablecoin_escrow = self.escrow("stablecoinEscrow")
+
+        def build(sp):
+            amount = self.coupon_amount(holder, self.coupons_paid(holder))
+            return [
+                (self.app_call(sp, holder, "coupon", self.escrow_accounts(), 2000), holder_sk),
+                (self.stablecoin_transfer(sp, stablecoin_escrow, holder, amount), stablecoin_escrow)
+            ]
+        return self.execute("coupon", build)
+
+    def sell(self, holder_sk):
+        """Claims the principal of all bonds of holder at maturity"""
+        holder = account.address_from_private_key(holder_sk)
+        bond_escrow = self.escrow("bondEscrow")
+        stablecoin_escrow = self.escrow("stablecoinEscrow")
+
+        def build(sp):
+            num_bonds = self.holding(holder, self.bond_id)
+            return [
+                (self.app_call(sp, holder, "sell", self.escrow_accounts(), 3000), holder_sk),
+                (self.bond_transfer(sp, bond_escrow, holder, bond_escrow.address, num_bonds), bond_escrow),
+                (self.stablecoin_transfer(
+                    sp, stablecoin_escrow, holder, num_bonds * self.bond_principal
+                ), stablecoin_escrow)
+            ]
+        return self.execute("sell", build)
+
+    def default(self, holder_sk):
+        """Claims the share of the stablecoin escrow owed to all bonds of holder after a default"""
+        holder = account.address_from_private_key(holder_sk)
+        bond_escrow = self.escrow("bondEscrow")
+        stablecoin_escrow = self.escrow("stablecoinEscrow")
+
+        def build(sp):
+            num_bonds = self.holding(holder, self.bond_id)
+            reserve = global_state(self.client.application_info(self.app_id)["params"]).get("reserve", 0)
+            escrow_balance = self.holding(stablecoin_escrow.address, self.stablecoin_id)
+            num_bonds_in_circ = self.bond_total - self.holding(bond_escrow.address, self.bond_id)
+            # same as stablecoin_transfer of on_default
+            amount = (escrow_balance - reserve) * num_bonds // num_bonds_in_circ
+            return [
+                (self.app_call(sp, holder, "default", self.escrow_accounts(), 3000), holder_sk),
+                (self.bond_transfer(sp, bond_escrow, holder, bond_escrow.address, num_bonds), bond_escrow),
+                (self.stablecoin_transfer(sp, stablecoin_escrow, holder, amount), stablecoin_escrow)
+            ]
+        return self.execute("default", build)
+
+    # EXECUTION
+
+    def execute(self, op, build):
+        """Builds, signs, submits and waits for the group of op, returning the app call's pending transaction info"""
+        metrics = self.metrics
+        metrics.add(IN_FLIGHT, 1, op=op)
+        result = "error"
+        try:
+            with metrics.timer(OP_SECONDS, op=op, stage="total"):
+                with metrics.timer(OP_SECONDS, op=op, stage="build"):
+                    group = build(self.suggested_params())
+                with metrics.timer(OP_SECONDS, op=op, stage="sign"):
+                    signed, asserts = self.sign(group)
+                try:
+                    with metrics.timer(OP_SECONDS, op=op, stage="submit"):
+                        self.client.send_transactions(signed)
+                    with metrics.timer(OP_SECONDS, op=op, stage="confirm"):
+                        info = self.confirm(signed)
+                except AlgodHTTPError as e:
+                    result = "rejected"
+                    raise self.rejected(op, str(e), asserts) from e
+            result = "confirmed"
+            return info
+        finally:
+            metrics.inc(OPS, op=op, result=result)
+            metrics.add(IN_FLIGHT, -1, op=op)
+
+    def sign(self, group):
+        """Signs group of (txn, private key or logic sig), returning it with the Assert maps of each txid"""
+        transaction.assign_group_id([txn for txn, _ in group])
+        signed = []
+        asserts = {}
+        for txn, signer in group:
+            if isinstance(signer, Compiled):
+                stxn = transaction.LogicSigTransaction(txn, signer.lsig)
+                asserts[stxn.get_txid()] = (signer.asserts, None)
+            elif isinstance(signer, transaction.LogicSig):
+                stxn = transaction.LogicSigTransaction(txn, signer)
+            else:
+                stxn = txn.sign(signer)
+            if isinstance(txn, transaction.ApplicationCallTxn):
+                asserts[stxn.get_txid()] = (None, self.approval)
+            signed.append(stxn)
+        return signed, asserts
+
+    def confirm(self, signed):
+        txid = signed[0].get_txid()
+        last_valid = signed[0].transaction.last_valid_round
+        last_round = self.client.status()["last-round"]
+        while True:
+            info = self.client.pending_transaction_info(txid)
+            if info.get("confirmed-round", 0) > 0:
+                return info
+            if info.get("pool-error"):
+                raise AlgodHTTPError(info["pool-error"])
+            if last_round > last_valid:
+                raise AlgodHTTPError("txn dead: round %d outside of last valid %d" % (last_round, last_valid))
+            last_round = self.client.status_after_block(last_round)["last-round"]
+
+    def rejected(self, op, message, asserts):
+        assertion, source = explain(message, asserts)
+        self.metrics.inc(REJECTIONS, op=op, assertion=assertion)
+        return Rejected(op, message, assertion, source)
+
+    # CACHES
+
+    def compiled(self, name, contract, *args):
+        """Returns contract(*args) of name compiled by algod, compiling it once per args"""
+        key = (name,) + args
+        with self.lock:
+            compiled = self.programs.get(key)
+            if compiled is None:
+                compiling = self.compiling.setdefault(key, threading.Lock())
+        self.metrics.inc(CACHE, cache="program", result="miss" if compiled is None else "hit")
+        if compiled is not None:
+            return compiled
+        # compile outside of self.lock so other ops are not held up, once per key however many miss at once
+        with compiling:
+            with self.lock:
+                compiled = self.programs.get(key)
+            if compiled is None:
+                with self.metrics.timer(COMPILE_SECONDS, program=name):
+                    teal, instructions = compile_traced(lambda: contract(*args), Mode.Signature, 4)
+                    program = base64.b64decode(self.client.compile(teal)["result"])
+                compiled = Compiled(program, AssertMap(instructions, program))
+                with self.lock:
+                    self.programs[key] = compiled
+                    self.compiling.pop(key, None)
+        return compiled
+
+    def escrow(self, name):
+        contract, asset_id = {
+            "bondEscrow": (bondEscrow.contract, self.bond_id),
+            "stablecoinEscrow": (stablecoinEscrow.contract, self.stablecoin_id)
+        }[name]
+        compiled = self.compiled(name, contract, self.app_id, asset_id, self.lv)
+        if compiled.address != self.escrow_addrs[name]:
+            raise ValueError("%s compiled with lv %d is %s but app has %s" % (
+                name, self.lv, compiled.address, self.escrow_addrs[name]
+            ))
+        return compiled
+
+    def suggested_params(self):
+        """Returns suggested params, fetching them at most once per params_ttl seconds"""
+        now = time.monotonic()
+        with self.params_lock:
+            cached = self.params
+        hit = cached is not None and now < cached[0]
+        self.metrics.inc(CACHE, cache="params", result="hit" if hit else "miss")
+        if hit:
+            return cached[1]
+        sp = self.client.suggested_params()
+        with self.params_lock:
+            self.params = (now + self.params_ttl, sp)
+        return sp
+
+    # TRANSACTIONS
+
+    def app_call(self, sp, sender, op, accounts, txn_fee):
+        return transaction.ApplicationNoOpTxn(
+            sender, fee(sp, txn_fee), self.app_id, app_args=[op.encode()], accounts=accounts,
+            foreign_assets=[self.bond_id, self.stablecoin_id]
+        )
+
+    def bond_transfer(self, sp, bond_escrow, sender, receiver, num_bonds):
+        return transaction.AssetTransferTxn(
+            bond_escrow.address, fee(sp, 0), receiver, num_bonds, self.bond_id, revocation_target=sender
+        )
+
+    def stablecoin_transfer(self, sp, stablecoin_escrow, receiver, amount):
+        return transaction.AssetTransferTxn(
+            stablecoin_escrow.address, fee(sp, 0), receiver, amount, self.stablecoin_id
+        )
+
+    def coupons_paid(self, address):
+        return local_state(self.client.account_info(address), self.app_id).get("coupons_paid", 0)
+
+    def coupon_amount(self, holder, coupons_paid):
+        """Returns the coupon owed to holder for the round after coupons_paid, same as coupon_setup of stateful.py"""
+        ratings = global_state(self.client.application_info(self.app_id)["params"])["ratings"]
+        multiplier = MULTIPLIERS[ratings[coupons_paid + 1]]
+        return self.bond_coupon * multiplier // 10000 * self.holding(holder, self.bond_id)
+
+    def lagging_coupon(self, sender, receiver):
+        """Returns the party of a trade_coupon with fewer coupons paid (receiver if equal) and the coupon owed to it"""
+        sender_paid = self.coupons_paid(sender)
+        receiver_paid = self.coupons_paid(receiver)
+        lagging, coupons_paid = (sender, sender_paid) if sender_paid < receiver_paid else (receiver, receiver_paid)
+        return lagging, self.coupon_amount(lagging, coupons_paid)
+
+    def escrow_accounts(self):
+        return [self.escrow_addrs["bondEscrow"], self.escrow_addrs["stablecoinEscrow"]]
+
+    def holding(self, address, asset_id):
+        for asset in self.client.account_info(address).get("assets", []):
+            if asset["asset-id"] == asset_id:
+                return asset["amount"]
+        return 0
+
+
+def fee(sp, txn_fee):
+    return transaction.SuggestedParams(txn_fee, sp.first, sp.last, sp.gh, sp.gen, flat_fee=True)
+
+
+def expiring(sp, lv):
+    """Returns sp for the bond transfer of a trade using a tradeLsig, which only approves one expiring before it does"""
+    if sp.first >= lv:
+        raise ValueError("trade lsig expired at round %d" % lv)
+    return transaction.SuggestedParams(sp.fee, sp.first, min(sp.last, lv - 1), sp.gh, sp.gen, flat_fee=True)
+
+
+def global_state(app):
+    return decode_state(app.get("global-state", []))
+
+
+def local_state(account_info, app_id):
+    for app in account_info.get("apps-local-state", []):
+        if app["id"] == app_id:
+            return decode_state(app.get("key-value", []))
+    return {}
+
+
+def decode_state(kvs):
+    state = {}
+    for kv in kvs:
+        value = kv["value"]
+        state[base64.b64decode(kv["key"]).decode()] = base64.b64decode(value["bytes"]) if value["type"] == 1 else value["uint"]
+    return state
@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# Histogram upper bounds in seconds, from cached signing up to waiting several rounds for confirmation
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+
+class Sink:
+    """
+    Receives every metric update, where labels is a sorted tuple of (name, value) pairs.
+    Subclass to forward metrics elsewhere, e.g. to statsd or logs. Updates may come from many threads.
+    """
+
+    def inc(self, name, labels, value):
+        """Adds value to a counter"""
+
+    def add(self, name, labels, value):
+        """Adds value, which may be negative, to a gauge"""
+
+    def observe(self, name, labels, value):
+        """Records value in a histogram"""
+
+
+class Metrics:
+    """Records metrics to every sink, so with no sinks each update costs one function call"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def inc(self, name, value=1, **labels):
+        labels = tuple(sorted(labels.items()))
+        for sink in self.sinks:
+            sink.inc(name, labels, value)
+
+    def add(self, name, value, **labels):
+        labels = tuple(sorted(labels.items()))
+        for sink in self.sinks:
+            sink.add(name, labels, value)
+
+    def observe(self, name, value, **labels):
+        labels = tuple(sorted(labels.items()))
+        for sink in self.sinks:
+            sink.observe(name, labels, value)
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+
+class Timer:
+    """Context manager which observes the seconds taken by its block, whether or not it raised"""
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class PrometheusSink(Sink):
+    """Aggregates metrics in memory and exports them in the Prometheus text format"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [count per bucket (last is +Inf), sum, count]
+        self.histograms = {}
+
+    def inc(self, name, labels, value):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def add(self, name, labels, value):
+        with self.lock:
+            self.gauges[(name, labels)] = self.gauges.get((name, labels), 0) + value
+
+    def observe(self, name, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def text(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, [list(h[0]), h[1], h[2]]) for key, h in self.histograms.items())
+
+        lines = []
+        typed = set()
+
+        def sample(name, labels, value, metric_type, metric=None):
+            metric = metric or name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append("# TYPE %s %s" % (metric, metric_type))
+            lines.append("%s%s %s" % (name, format_labels(labels), format_value(value)))
+
+        for (name, labels), value in counters:
+            sample(name, labels, value, "counter")
+        for (name, labels), value in gauges:
+            sample(name, labels, value, "gauge")
+        for (name, labels), (counts, total, count) in histograms:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                sample(name + "_bucket", labels + (("le", format_value(bound)),), cumulative, "histogram", name)
+            sample(name + "_sum", labels, total, "histogram", name)
+            sample(name + "_count", labels, count, "histogram", name)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, address=""):
+        """Serves text() at /metrics from a daemon thread, returning the server so it can be shut down"""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((address, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for name, value in labels
+    )
+
+
+def format_value(value):
+    return "+Inf" if value == float("inf") else repr(value)
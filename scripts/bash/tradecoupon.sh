@@ -0,0 +1,89 @@
+#!/bin/bash
+
+date '+keyreg-teal-test start %Y%m%d_%H%M%S'
+
+set -e
+set -x
+set -o pipefail
+export SHELLOPTS
+
+gcmd="goal -d ../../net1/Primary"
+gcmd2="goal -d ../../net1/Node"
+
+ACCOUNT=$(${gcmd} account list | awk '{ print $3 }' | head -n 1)
+ACCOUNT2=$(${gcmd2} account list | awk '{ print $3 }' | head -n 1)
+
+# compile stateless contract for bond to get its address
+BOND_STATELESS_TEAL="../../generated-src/bondEscrow.teal"
+BOND_STATELESS_ADDRESS=$(
+  ${gcmd2} clerk compile -n ${BOND_STATELESS_TEAL} |
+    awk '{ print $2 }' |
+    head -n 1
+)
+echo "Bond Stateless Contract Address = ${BOND_STATELESS_ADDRESS}"
+
+# compile stateless contract for stablecoin to get its address
+STABLECOIN_STATELESS_TEAL="../../generated-src/stablecoinEscrow.teal"
+STABLECOIN_STATELESS_ADDRESS=$(
+  ${gcmd2} clerk compile -n ${STABLECOIN_STATELESS_TEAL} |
+    awk '{ print $2 }' |
+    head -n 1
+)
+echo "Stablecoin Stateless Contract Address = ${STABLECOIN_STATELESS_ADDRESS}"
+
+BOND_ID=1
+STABLECOIN_ID=2
+APP_ID=3
+
+# Assumes ACCOUNT2 is trading 1 bond to ACCOUNT, both are opted into the app and bond and unfrozen,
+# and one of them has claimed exactly one more coupon round than the other.
+# Coupon is owed to whichever is behind, for the bonds it holds before the trade, at the rating of
+# the round it is claiming: bond_coupon * multiplier // 10000 * balance (as in stateful.py)
+GLOBAL_STATE=$(${gcmd} app read --app-id ${APP_ID} --global --from ${ACCOUNT})
+LOCAL_STATE=$(${gcmd} app read --app-id ${APP_ID} --local --from ${ACCOUNT})
+LOCAL_STATE2=$(${gcmd2} app read --app-id ${APP_ID} --local --from ${ACCOUNT2})
+ACCOUNT_DUMP=$(${gcmd} account dump -a ${ACCOUNT})
+ACCOUNT_DUMP2=$(${gcmd2} account dump -a ${ACCOUNT2})
+read -r LAGGING_INDEX COUPON_AMOUNT < <(
+  python3 - "${BOND_ID}" "${GLOBAL_STATE}" "${LOCAL_STATE}" "${LOCAL_STATE2}" "${ACCOUNT_DUMP}" "${ACCOUNT_DUMP2}" <<'PY'
+import json, sys
+bond_id, app, local, local2, dump, dump2 = sys.argv[1], *map(json.loads, sys.argv[2:])
+cps = [local.get("coupons_paid", {}).get("ui", 0), local2.get("coupons_paid", {}).get("ui", 0)]
+assert abs(cps[0] - cps[1]) == 1, "coupons paid must differ by one round: %s" % cps
+lagging = 0 if cps[0] < cps[1] else 1
+balance = [dump, dump2][lagging].get("asset", {}).get(bond_id, {}).get("a", 0)
+rating = ord(app["ratings"]["tb"][cps[lagging] + 1])
+multiplier = {5: 10000, 4: 11000, 3: 12100, 2: 13310, 1: 14641, 0: 10000}[rating]
+print(lagging, app["bond_coupon"]["ui"] * multiplier // 10000 * balance)
+PY
+)
+if [ "${LAGGING_INDEX}" = "0" ]; then LAGGING=${ACCOUNT}; else LAGGING=${ACCOUNT2}; fi
+echo "Coupon of ${COUPON_AMOUNT} owed to ${LAGGING}"
+
+# create transactions
+${gcmd2} app call --app-id ${APP_ID} --app-arg "str:trade_coupon" --app-account ${BOND_STATELESS_ADDRESS} --app-account ${STABLECOIN_STATELESS_ADDRESS} --app-account ${ACCOUNT} --foreign-asset ${BOND_ID} --foreign-asset ${STABLECOIN_ID} --from ${ACCOUNT2} --out=unsignedtx0.tx
+${gcmd2} asset send --from=${ACCOUNT2} --to=${ACCOUNT} --assetid ${BOND_ID} --clawback ${BOND_STATELESS_ADDRESS} --fee=0 --amount=1 --out=unsignedtx1.tx
+${gcmd2} asset send --from=${STABLECOIN_STATELESS_ADDRESS} --to=${LAGGING} --assetid ${STABLECOIN_ID} --fee=0 --amount=${COUPON_AMOUNT} --out=unsignedtx2.tx
+${gcmd2} clerk send --from=${ACCOUNT2} --to=${ACCOUNT2} --fee=3000 --amount=0 --out=unsignedtx3.tx
+# combine transactions
+cat unsignedtx0.tx unsignedtx1.tx unsignedtx2.tx unsignedtx3.tx >combinedtransactions.tx
+# group transactions
+${gcmd2} clerk group -i combinedtransactions.tx -o groupedtransactions.tx
+# split transactions
+${gcmd2} clerk split -i groupedtransactions.tx -o split.tx
+# sign transactions
+${gcmd2} clerk sign -i split-0.tx -o signout-0.tx
+${gcmd2} clerk sign -i split-1.tx -p ${BOND_STATELESS_TEAL} -o signout-1.tx
+${gcmd2} clerk sign -i split-2.tx -p ${STABLECOIN_STATELESS_TEAL} -o signout-2.tx
+${gcmd2} clerk sign -i split-3.tx -o signout-3.tx
+# assemble transaction group
+cat signout-0.tx signout-1.tx signout-2.tx signout-3.tx >signout.tx
+# submit
+${gcmd2} clerk rawsend -f signout.tx
+
+# Read local state of contract to see ownership and coupon payment installments
+${gcmd} app read --app-id ${APP_ID} --guess-format --local --from ${ACCOUNT}
+${gcmd2} app read --app-id ${APP_ID} --guess-format --local --from ${ACCOUNT2}
+
+# clean up files
+rm -f *.tx
@@ -0,0 +1,380 @@
+const { decodeAddress } = require('algosdk');
+const { Runtime, AccountStore, stringToBytes, types } = require('@algo-builder/runtime');
+const { assert } = require('chai');
+const {
+  greenVerifierAddr,
+  financialRegulatorAddr,
+  investorAddr,
+  issuerAddr,
+  masterAddr,
+  traderAddr,
+  MIN_BALANCE,
+  PERIOD,
+  BOND_LENGTH,
+  START_BUY_DATE,
+  END_BUY_DATE,
+  MATURITY_DATE,
+  BOND_COST,
+  BOND_COUPON,
+  BOND_PRINCIPAL,
+  compileProgram,
+  fundAlgo,
+  fundAsset,
+  couponTxns,
+  tradeCouponTxns,
+  tradeCouponTxnsUsingLsig
+} = require("./utils");
+
+describe('Trade With Coupon Tests', function () {
+  let runtime;
+  let master, issuer, investor, trader, greenVerifier, financialRegulator;
+  let bondEscrowLsig, stablecoinEscrowLsig;
+  let appId, bondId, stablecoinId;
+
+  const LV = 1500;
+  const INVESTOR_BONDS = 3;
+  const TRADER_BONDS = 1;
+  const NUM_BONDS_TRADING = 2;
+  const TRADE_PRICE = 60;
+
+  const getGlobal = (key) => runtime.getGlobalState(appId, key);
+  const getLocal = (addr, key) => runtime.getLocalState(appId, addr, key);
+  const getBalance = (addr, assetId) => runtime.getAssetHolding(assetId, addr).amount;
+
+  // fetch latest account state
+  function syncAccounts () {
+    master = runtime.getAccount(masterAddr);
+    issuer = runtime.getAccount(issuerAddr);
+    investor = runtime.getAccount(investorAddr);
+    trader = runtime.getAccount(traderAddr);
+  }
+
+  function callApp(account, appArgs, accounts) {
+    runtime.executeTx({
+      type: types.TransactionType.CallNoOpSSC,
+      sign: types.SignType.SecretKey,
+      fromAccount: account,
+      appId,
+      payFlags: {},
+      appArgs,
+      accounts
+    });
+  }
+
+  /**
+   * This function buys bonds
+   */
+  function buyBond(noOfBonds, account) {
+    runtime.executeTx([
+      {
+        type: types.TransactionType.CallNoOpSSC,
+        sign: types.SignType.SecretKey,
+        fromAccount: account,
+        appId,
+        payFlags: { totalFee: 2000 },
+        appArgs: [stringToBytes('buy')]
+      },
+      {
+        type: types.TransactionType.RevokeAsset,
+        sign: types.SignType.LogicSignature,
+        fromAccountAddr: bondEscrowLsig.address(),
+        lsig: bondEscrowLsig,
+        revocationTarget: bondEscrowLsig.address(),
+        recipient: account.addr,
+        amount: noOfBonds,
+        assetID: bondId,
+        payFlags: { totalFee: 0 }
+      },
+      {
+        type: types.TransactionType.TransferAsset,
+        sign: types.SignType.SecretKey,
+        fromAccount: account,
+        toAccountAddr: issuerAddr,
+        amount: noOfBonds * BOND_COST,
+        assetID: stablecoinId,
+        payFlags: { totalFee: 1000 }
+      }
+    ]);
+  }
+
+  function claimCoupon(account) {
+    const noOfBonds = getBalance(account.addr, bondId);
+    runtime.executeTx(couponTxns(
+      noOfBonds,
+      BOND_COUPON,
+      stablecoinEscrowLsig,
+      bondEscrowLsig,
+      bondId,
+      stablecoinId,
+      appId,
+      account
+    ));
+  }
+
+  function tradeCouponTxGroup(couponAmount, couponReceiverAddr) {
+    return tradeCouponTxns(
+      NUM_BONDS_TRADING,
+      couponAmount,
+      couponReceiverAddr,
+      stablecoinEscrowLsig,
+      bondEscrowLsig,
+      bondId,
+      stablecoinId,
+      appId,
+      investor.account,
+      traderAddr
+    );
+  }
+
+  /**
+   * This creates bond, stablecoin, app and escrow accounts, where investor owns 3 bonds and trader 1
+   */
+  this.beforeEach(() => {
+    master = new AccountStore(1000e6, { addr: masterAddr, sk: new Uint8Array(0) });
+    issuer = new AccountStore(MIN_BALANCE, { addr: issuerAddr, sk: new Uint8Array(0) });
+    investor = new AccountStore(MIN_BALANCE, { addr: investorAddr, sk: new Uint8Array(
+      [55,99,85,4,192,247,129,39,58,174,90,54,27,69,174,254,27,91,1,151,107,66,183,
+        200,141,138, 63,48,210,132,128,238,40,163,38,61,81,199,82,249,113,16,211,62,254,38,
+        49,66,100,120,221,125,150,218,89,152,248,127,77,1,234,228,139,113])
+    });
+    trader = new AccountStore(MIN_BALANCE, { addr: traderAddr, sk: new Uint8Array(0) });
+    greenVerifier = new AccountStore(MIN_BALANCE, { addr: greenVerifierAddr, sk: new Uint8Array(0) });
+    financialRegulator = new AccountStore(MIN_BALANCE, { addr: financialRegulatorAddr, sk: new Uint8Array(0) });
+    runtime = new Runtime([master, issuer, investor, trader, greenVerifier, financialRegulator]);
+
+    bondId = runtime.addAsset("bond", { creator: { ...master.account, name: 'master' } });
+    stablecoinId = runtime.addAsset("stablecoin", { creator: { ...master.account, name: 'master' } });
+
+    // create app
+    const clearProgram = compileProgram('clear.py');
+    appId = runtime.addApp({
+      sender: master.account,
+      localInts: 3,
+      localBytes: 0,
+      globalInts: 11,
+      globalBytes: 6,
+      appArgs: [
+        'int:' + START_BUY_DATE,
+        'int:' + END_BUY_DATE,
+        'int:' + MATURITY_DATE,
+        'int:' + bondId,
+        'int:' + BOND_COUPON,
+        'int:' + BOND_PRINCIPAL,
+        'int:' + BOND_LENGTH,
+        'int:' + BOND_COST,
+        decodeAddress(issuerAddr).publicKey,
+        decodeAddress(financialRegulatorAddr).publicKey,
+        decodeAddress(greenVerifierAddr).publicKey
+      ]
+    }, {}, compileProgram('initial.py'), clearProgram);
+
+    // setup escrows
+    bondEscrowLsig = runtime.getLogicSig(compileProgram('bondEscrow.py', appId, bondId, LV), []);
+    stablecoinEscrowLsig = runtime.getLogicSig(compileProgram('stablecoinEscrow.py', appId, stablecoinId, LV), []);
+    const bondEscrowAddress = bondEscrowLsig.address();
+    const stablecoinEscrowAddress = stablecoinEscrowLsig.address();
+    fundAlgo(runtime, master.account, bondEscrowAddress, MIN_BALANCE);
+    fundAlgo(runtime, master.account, stablecoinEscrowAddress, MIN_BALANCE);
+    runtime.optIntoASA(bondId, bondEscrowAddress, {});
+    runtime.optIntoASA(stablecoinId, stablecoinEscrowAddress, {});
+
+    // send all bonds to bond escrow and make it the clawback
+    runtime.executeTx({
+      type: types.TransactionType.RevokeAsset,
+      sign: types.SignType.SecretKey,
+      fromAccount: master.account,
+      revocationTarget: masterAddr,
+      recipient: bondEscrowAddress,
+      amount: 100000000,
+      assetID: bondId,
+      payFlags: {}
+    });
+    runtime.executeTx({
+      type: types.TransactionType.ModifyAsset,
+      sign: types.SignType.SecretKey,
+      fromAccount: master.account,
+      assetID: bondId,
+      fields: {
+        manager: "",
+        freeze: "",
+        clawback: bondEscrowAddress
+      },
+      payFlags: {}
+    });
+
+    // update app
+    runtime.updateApp(masterAddr, appId, compileProgram('stateful.py', stablecoinId), clearProgram, {}, {
+      appArgs: [decodeAddress(stablecoinEscrowAddress).publicKey, decodeAddress(bondEscrowAddress).publicKey]
+    });
+
+    // setup investor and trader
+    runtime.optIntoASA(stablecoinId, issuerAddr, {});
+    for (const addr of [investorAddr, traderAddr]) {
+      runtime.optIntoASA(bondId, addr, {});
+      runtime.optIntoASA(stablecoinId, addr, {});
+      runtime.optInToApp(addr, appId, {}, {});
+      callApp(financialRegulator.account, [stringToBytes('freeze'), 'int:1'], [addr]);
+    }
+    callApp(financialRegulator.account, [stringToBytes('freeze_all'), 'int:1']);
+    syncAccounts();
+
+    // buy
+    runtime.setRoundAndTimestamp(3, START_BUY_DATE);
+    fundAsset(runtime, master.account, investorAddr, stablecoinId, BOND_COST * INVESTOR_BONDS);
+    fundAsset(runtime, master.account, traderAddr, stablecoinId, BOND_COST * TRADER_BONDS);
+    buyBond(INVESTOR_BONDS, investor.account);
+    buyBond(TRADER_BONDS, trader.account);
+    callApp(investor.account, [stringToBytes('set_trade'), 'int:' + INVESTOR_BONDS]);
+
+    // enough for every coupon round
+    fundAsset(
+      runtime, master.account, stablecoinEscrowAddress, stablecoinId,
+      BOND_COUPON * (INVESTOR_BONDS + TRADER_BONDS) * BOND_LENGTH
+    );
+  });
+
+  it('coupon path is unchanged', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+
+    assert.equal(getLocal(investorAddr, 'coupons_paid'), 1);
+    assert.equal(getGlobal('coupons_paid'), 1);
+    assert.equal(getGlobal('reserve'), BOND_COUPON * TRADER_BONDS);
+    assert.equal(getBalance(investorAddr, stablecoinId), BOND_COUPON * INVESTOR_BONDS);
+  });
+
+  it('can trade with coupon when receiver is lagging', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+
+    // paid for the bond it held before the trade
+    runtime.executeTx(tradeCouponTxGroup(BOND_COUPON * TRADER_BONDS, traderAddr));
+
+    assert.equal(getLocal(investorAddr, 'coupons_paid'), 1);
+    assert.equal(getLocal(traderAddr, 'coupons_paid'), 1);
+    assert.equal(getLocal(investorAddr, 'trade'), INVESTOR_BONDS - NUM_BONDS_TRADING);
+    assert.equal(getGlobal('coupons_paid'), 1);
+    assert.equal(getGlobal('reserve'), 0);
+    assert.equal(getBalance(traderAddr, stablecoinId), BOND_COUPON * TRADER_BONDS);
+    assert.equal(getBalance(traderAddr, bondId), TRADER_BONDS + NUM_BONDS_TRADING);
+    assert.equal(getBalance(investorAddr, bondId), INVESTOR_BONDS - NUM_BONDS_TRADING);
+  });
+
+  it('can trade with coupon when sender is lagging', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(trader.account);
+
+    // paid for the bonds it held before the trade
+    runtime.executeTx(tradeCouponTxGroup(BOND_COUPON * INVESTOR_BONDS, investorAddr));
+
+    assert.equal(getLocal(investorAddr, 'coupons_paid'), 1);
+    assert.equal(getLocal(traderAddr, 'coupons_paid'), 1);
+    assert.equal(getGlobal('coupons_paid'), 1);
+    assert.equal(getGlobal('reserve'), 0);
+    assert.equal(getBalance(investorAddr, stablecoinId), BOND_COUPON * INVESTOR_BONDS);
+    assert.equal(getBalance(traderAddr, bondId), TRADER_BONDS + NUM_BONDS_TRADING);
+  });
+
+  it('can trade with coupon using lsig with payment at tx3', () => {
+    const tradeLsig = runtime.getLogicSig(
+      compileProgram('tradeLsig.py', appId, stablecoinId, bondId, LV, TRADE_PRICE), []
+    );
+    tradeLsig.sign(investor.account.sk);
+
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+    fundAsset(runtime, master.account, traderAddr, stablecoinId, TRADE_PRICE * NUM_BONDS_TRADING);
+
+    runtime.executeTx(tradeCouponTxnsUsingLsig(
+      NUM_BONDS_TRADING,
+      TRADE_PRICE,
+      BOND_COUPON * TRADER_BONDS,
+      traderAddr,
+      tradeLsig,
+      stablecoinEscrowLsig,
+      bondEscrowLsig,
+      bondId,
+      stablecoinId,
+      appId,
+      trader.account,
+      investorAddr
+    ));
+
+    assert.equal(getLocal(traderAddr, 'coupons_paid'), 1);
+    assert.equal(getGlobal('reserve'), 0);
+    assert.equal(getBalance(traderAddr, stablecoinId), BOND_COUPON * TRADER_BONDS);
+    assert.equal(
+      getBalance(investorAddr, stablecoinId),
+      BOND_COUPON * INVESTOR_BONDS + TRADE_PRICE * NUM_BONDS_TRADING
+    );
+  });
+
+  it('cannot trade with coupon when neither is lagging', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+    claimCoupon(trader.account);
+
+    assert.throws(
+      () => runtime.executeTx(tradeCouponTxGroup(BOND_COUPON * TRADER_BONDS, traderAddr)),
+      'RUNTIME_ERR1009: TEAL runtime encountered err opcode'
+    );
+  });
+
+  it('cannot trade with coupon when lagging by more than one round', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + 2 * PERIOD);
+    claimCoupon(investor.account);
+    claimCoupon(investor.account);
+
+    assert.throws(
+      () => runtime.executeTx(tradeCouponTxGroup(BOND_COUPON * TRADER_BONDS, traderAddr)),
+      'RUNTIME_ERR1009: TEAL runtime encountered err opcode'
+    );
+  });
+
+  it('cannot trade with coupon when paying wrong coupon amount', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+
+    assert.throws(
+      () => runtime.executeTx(tradeCouponTxGroup(BOND_COUPON * TRADER_BONDS - 1, traderAddr)),
+      'RUNTIME_ERR1009: TEAL runtime encountered err opcode'
+    );
+  });
+
+  it('cannot trade with coupon when paying coupon to party which is not lagging', () => {
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+
+    assert.throws(
+      () => runtime.executeTx(tradeCouponTxGroup(BOND_COUPON * TRADER_BONDS, investorAddr)),
+      'RUNTIME_ERR1009: TEAL runtime encountered err opcode'
+    );
+  });
+
+  it('cannot trade with coupon when receiver owns no bonds', () => {
+    // issuer is approved but never bought
+    runtime.optIntoASA(bondId, issuerAddr, {});
+    runtime.optInToApp(issuerAddr, appId, {}, {});
+    callApp(financialRegulator.account, [stringToBytes('freeze'), 'int:1'], [issuerAddr]);
+
+    runtime.setRoundAndTimestamp(4, END_BUY_DATE + PERIOD);
+    claimCoupon(investor.account);
+
+    const txGroup = tradeCouponTxns(
+      NUM_BONDS_TRADING,
+      0,
+      issuerAddr,
+      stablecoinEscrowLsig,
+      bondEscrowLsig,
+      bondId,
+      stablecoinId,
+      appId,
+      investor.account,
+      issuerAddr
+    );
+    assert.throws(
+      () => runtime.executeTx(txGroup),
+      'RUNTIME_ERR1009: TEAL runtime encountered err opcode'
+    );
+  });
+});
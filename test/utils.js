@@ -1,3 +1,5 @@
+const { execFileSync } = require('child_process');
+const path = require('path');
 const { getProgram } = require('@algo-builder/algob');
 const { types, stringToBytes } = require('@algo-builder/runtime');
 
@@ -36,6 +38,13 @@ const manageStateStorage = {
   globalBytes: 1,  // <rating-array> Math.ceil((bondLength + 1) / 8)
 };
 
+/**
+ * This function compiles a PyTeal contract which takes its parameters as command line arguments
+ */
+function compileProgram(file, ...args) {
+  return execFileSync('python3', [path.join(__dirname, '..', 'assets', file), ...args.map(String)]).toString();
+}
+
 /**
  * This function creates initial app and returns its app id
  */
@@ -493,6 +502,164 @@ function claimDefaultTxns(
   ];
 }
 
+/**
+ * Generates atomic txns to claim coupon (bond and stablecoin escrows in accounts array)
+ */
+function couponTxns(
+  noOfBonds,
+  bondCoupon,
+  stablecoinEscrowLsig,
+  bondEscrowLsig,
+  bondId,
+  stablecoinId,
+  mainAppId,
+  investorAcc,
+) {
+  const stablecoinEscrowAddr = stablecoinEscrowLsig.address();
+  const bondEscrowAddr = bondEscrowLsig.address();
+
+  return [
+    {
+      type: types.TransactionType.CallNoOpSSC,
+      sign: types.SignType.SecretKey,
+      fromAccount: investorAcc,
+      appId: mainAppId,
+      payFlags: { totalFee: 2000 },
+      appArgs: [stringToBytes('coupon')],
+      accounts: [bondEscrowAddr, stablecoinEscrowAddr],
+      foreignAssets: [bondId, stablecoinId]
+    },
+    {
+      type: types.TransactionType.TransferAsset,
+      sign: types.SignType.LogicSignature,
+      fromAccountAddr: stablecoinEscrowAddr,
+      lsig: stablecoinEscrowLsig,
+      toAccountAddr: investorAcc.addr,
+      amount: noOfBonds * bondCoupon,
+      assetID: stablecoinId,
+      payFlags: { totalFee: 0 }
+    }
+  ];
+}
+
+/**
+ * Generates atomic txns to trade bond to an existing owner while paying the lagging party their coupon
+ */
+function tradeCouponTxns(
+  noOfBonds,
+  couponAmount,
+  couponReceiverAddr,
+  stablecoinEscrowLsig,
+  bondEscrowLsig,
+  bondId,
+  stablecoinId,
+  mainAppId,
+  senderAcc,
+  receiverAddr,
+) {
+  const stablecoinEscrowAddr = stablecoinEscrowLsig.address();
+  const bondEscrowAddr = bondEscrowLsig.address();
+
+  return [
+    {
+      type: types.TransactionType.CallNoOpSSC,
+      sign: types.SignType.SecretKey,
+      fromAccount: senderAcc,
+      appId: mainAppId,
+      payFlags: { totalFee: 3000 },
+      appArgs: [stringToBytes('trade_coupon')],
+      accounts: [bondEscrowAddr, stablecoinEscrowAddr, receiverAddr],
+      foreignAssets: [bondId, stablecoinId]
+    },
+    {
+      type: types.TransactionType.RevokeAsset,
+      sign: types.SignType.LogicSignature,
+      fromAccountAddr: bondEscrowAddr,
+      lsig: bondEscrowLsig,
+      revocationTarget: senderAcc.addr,
+      recipient: receiverAddr,
+      amount: noOfBonds,
+      assetID: bondId,
+      payFlags: { totalFee: 0 }
+    },
+    {
+      type: types.TransactionType.TransferAsset,
+      sign: types.SignType.LogicSignature,
+      fromAccountAddr: stablecoinEscrowAddr,
+      lsig: stablecoinEscrowLsig,
+      toAccountAddr: couponReceiverAddr,
+      amount: couponAmount,
+      assetID: stablecoinId,
+      payFlags: { totalFee: 0 }
+    }
+  ];
+}
+
+/**
+ * Generates atomic txns to trade bond with coupon using seller's logic sig (payment at tx3)
+ */
+function tradeCouponTxnsUsingLsig(
+  noOfBonds,
+  price,
+  couponAmount,
+  couponReceiverAddr,
+  tradeLsig,
+  stablecoinEscrowLsig,
+  bondEscrowLsig,
+  bondId,
+  stablecoinId,
+  mainAppId,
+  traderAcc,
+  sellerAddr,
+) {
+  const stablecoinEscrowAddr = stablecoinEscrowLsig.address();
+  const bondEscrowAddr = bondEscrowLsig.address();
+
+  return [
+    {
+      type: types.TransactionType.CallNoOpSSC,
+      sign: types.SignType.LogicSignature,
+      fromAccountAddr: sellerAddr,
+      lsig: tradeLsig,
+      appId: mainAppId,
+      payFlags: { totalFee: 1000 },
+      appArgs: [stringToBytes('trade_coupon')],
+      accounts: [bondEscrowAddr, stablecoinEscrowAddr, traderAcc.addr],
+      foreignAssets: [bondId, stablecoinId]
+    },
+    {
+      type: types.TransactionType.RevokeAsset,
+      sign: types.SignType.LogicSignature,
+      fromAccountAddr: bondEscrowAddr,
+      lsig: bondEscrowLsig,
+      revocationTarget: sellerAddr,
+      recipient: traderAcc.addr,
+      amount: noOfBonds,
+      assetID: bondId,
+      payFlags: { totalFee: 0 }
+    },
+    {
+      type: types.TransactionType.TransferAsset,
+      sign: types.SignType.LogicSignature,
+      fromAccountAddr: stablecoinEscrowAddr,
+      lsig: stablecoinEscrowLsig,
+      toAccountAddr: couponReceiverAddr,
+      amount: couponAmount,
+      assetID: stablecoinId,
+      payFlags: { totalFee: 0 }
+    },
+    {
+      type: types.TransactionType.TransferAsset,
+      sign: types.SignType.SecretKey,
+      fromAccount: traderAcc,
+      toAccountAddr: sellerAddr,
+      amount: noOfBonds * price,
+      assetID: stablecoinId,
+      payFlags: { totalFee: 3000 }
+    }
+  ];
+}
+
 module.exports = {
   masterAddr,
   issuerAddr,
@@ -511,6 +678,7 @@ module.exports = {
   BOND_PRINCIPAL,
   mainStateStorage,
   manageStateStorage,
+  compileProgram,
   createInitialApp,
   updateMainApp,
   updateManageApp,
@@ -521,5 +689,8 @@ module.exports = {
   tradeTxnsUsingLsig,
   claimCouponTxns,
   claimPrincipalTxns,
-  claimDefaultTxns
+  claimDefaultTxns,
+  couponTxns,
+  tradeCouponTxns,
+  tradeCouponTxnsUsingLsig
 };
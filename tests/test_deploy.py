@@ -0,0 +1,264 @@
+import base64
+import copy
+import os
+
+import pytest
+import yaml
+from algosdk import account, logic
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+
+from deploy.graph import Checkpoint, Deployer, Step
+from deploy.standin import StandinAlgod
+from deploy.steps import steps
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "deploy", "issues.example.yaml")
+MAX_BLOCKS = 100
+
+
+class Crash(Exception):
+    pass
+
+
+class Algod(StandinAlgod):
+    """Stand-in which can crash the deployer on a given send or block, forget confirmed txns and reject txns"""
+
+    def __init__(self):
+        super().__init__()
+        self.crash_on_send = None
+        self.crash_on_block = None
+        self.forget = False
+        self.reject = lambda stxn: False
+        self.blocks = 0
+
+    def send_transactions(self, group):
+        if self.crash_on_send is not None:
+            self.crash_on_send -= 1
+            if self.crash_on_send < 0:
+                self.crash_on_send = None
+                raise Crash()
+        if any(self.reject(stxn) for stxn in group):
+            raise AlgodHTTPError("TransactionPool.Remember: transaction %s: overspend" % group[0].get_txid(), 400)
+        return super().send_transactions(group)
+
+    def status_after_block(self, round_num):
+        self.blocks += 1
+        assert self.blocks < MAX_BLOCKS, "deployment did not finish"
+        status = super().status_after_block(round_num)
+        if self.crash_on_block is not None:
+            self.crash_on_block -= 1
+            if self.crash_on_block < 0:
+                self.crash_on_block = None
+                raise Crash()
+        return status
+
+    def pending_transaction_info(self, txid):
+        # as a node does for transactions confirmed many rounds ago
+        if self.forget and txid in self.confirmed:
+            raise AlgodHTTPError("txn does not exist", 404)
+        return super().pending_transaction_info(txid)
+
+
+def make_config(names):
+    with open(EXAMPLE) as f:
+        example = yaml.safe_load(f)
+    config = {"escrow_algos": example["escrow_algos"], "issues": []}
+    for name in names:
+        issue = copy.deepcopy(example["issues"][0])
+        issue["name"] = name
+        config["issues"].append(issue)
+    return config
+
+
+@pytest.fixture
+def deploy(tmp_path):
+    private_key, _ = account.generate_account()
+
+    def run(client, config, name="issues"):
+        # checkpoint is read from disk every run, as after a crash
+        checkpoint = Checkpoint(str(tmp_path / (name + ".checkpoint.json")))
+        failed = Deployer(client, steps(client, config, private_key), checkpoint, log=lambda message: None).deploy()
+        return failed, checkpoint
+
+    return run
+
+
+def created(client):
+    return sorted(asset["params"]["name"] for asset in client.assets.values()), len(client.apps)
+
+
+def assert_deployed(client, config, checkpoint):
+    names = [issue["name"] for issue in config["issues"]]
+    assert created(client) == (sorted(names + ["USDC"]), len(names))
+    for name in names:
+        bond_id = checkpoint.done[name + "/create_bond"]["bond_id"]
+        app_id = checkpoint.done[name + "/create_app"]["app_id"]
+        escrows = checkpoint.done[name + "/compile_escrows"]
+        assert client.asset_info(bond_id)["params"]["name"] == name
+        assert client.asset_info(bond_id)["params"]["clawback"] == escrows["bond_escrow"]["address"]
+        assert client.application_info(app_id)["params"]["approval-program"] == checkpoint.done["compile/stateful"]["program"]
+        assert client.account_info(escrows["bond_escrow"]["address"])["assets"] == [
+            {"asset-id": bond_id, "amount": config["issues"][0]["bond_total"]}
+        ]
+
+
+def test_deploy_respects_dependencies(deploy):
+    config = make_config(["a", "b", "c"])
+    client = Algod()
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert not checkpoint.submitted
+    assert_deployed(client, config, checkpoint)
+
+    order = list(checkpoint.done)
+    graph = {step.key: step for step in steps(client, config, account.generate_account()[0])}
+    assert sorted(order) == sorted(graph)
+    for key in order:
+        assert all(order.index(dep) < order.index(key) for dep in graph[key].deps), key
+
+
+def test_deploy_pipelines_issues(deploy):
+    client = Algod()
+    deploy(client, make_config(["a"]), "one")
+    rounds = client.round
+
+    client = Algod()
+    config = make_config(["issue-%d" % i for i in range(20)])
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert client.round == rounds
+    assert_deployed(client, config, checkpoint)
+
+
+@pytest.mark.parametrize("sends", range(6))
+def test_resume_after_crash_between_save_and_send(deploy, sends):
+    config = make_config(["a", "b"])
+    client = Algod()
+    client.crash_on_send = sends
+    with pytest.raises(Crash):
+        deploy(client, config)
+
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert_deployed(client, config, checkpoint)
+
+
+@pytest.mark.parametrize("blocks", range(5))
+def test_resume_after_crash_once_sent(deploy, blocks):
+    config = make_config(["a"])
+    client = Algod()
+    client.crash_on_block = blocks
+    with pytest.raises(Crash):
+        deploy(client, config)
+
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert_deployed(client, config, checkpoint)
+
+
+@pytest.mark.parametrize("sends", [0, 1, 3])
+def test_resume_after_expiry_of_unsent_group(deploy, sends):
+    config = make_config(["a"])
+    client = Algod()
+    client.crash_on_send = sends
+    with pytest.raises(Crash):
+        deploy(client, config)
+    client.status_after_block(client.round + 1001)
+
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert_deployed(client, config, checkpoint)
+
+
+@pytest.mark.parametrize("blocks", range(5))
+def test_resume_after_expiry_of_confirmed_group(deploy, blocks):
+    config = make_config(["a"])
+    client = Algod()
+    client.crash_on_block = blocks
+    with pytest.raises(Crash):
+        deploy(client, config)
+    client.status_after_block(client.round + 1001)
+    client.forget = True
+
+    # every submitted step must be recovered from the ledger rather than built again
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert_deployed(client, config, checkpoint)
+
+
+def test_resume_does_not_recover_assets_of_earlier_deployment(deploy):
+    config = make_config(["a"])
+    client = Algod()
+    _, earlier = deploy(client, config, "earlier")
+
+    # same creator and issue name, crashing before the groups creating the stablecoin and bond are sent
+    client.crash_on_send = 0
+    with pytest.raises(Crash):
+        deploy(client, config)
+    client.status_after_block(client.round + 1001)
+
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert created(client) == (["USDC", "USDC", "a", "a"], 2)
+    assert checkpoint.done["stablecoin"]["stablecoin_id"] != earlier.done["stablecoin"]["stablecoin_id"]
+    assert checkpoint.done["a/create_bond"]["bond_id"] != earlier.done["a/create_bond"]["bond_id"]
+    bond_escrow = checkpoint.done["a/compile_escrows"]["bond_escrow"]["address"]
+    assert client.asset_info(checkpoint.done["a/create_bond"]["bond_id"])["params"]["clawback"] == bond_escrow
+
+
+def test_every_on_chain_step_recovers(deploy):
+    config = make_config(["a", "b"])
+    client = Algod()
+    client.forget = True
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert_deployed(client, config, checkpoint)
+
+
+def test_failure_blocks_dependents(deploy):
+    config = make_config(["good", "bad"])
+    client = Algod()
+    client.reject = lambda stxn: isinstance(stxn.transaction, transaction.AssetCreateTxn) and \
+        stxn.transaction.asset_name == "bad"
+    failed, checkpoint = deploy(client, config)
+
+    assert failed == sorted("bad/" + step for step in [
+        "create_bond", "create_app", "compile_escrows", "fund_escrows", "opt_in_bond_escrow",
+        "opt_in_stablecoin_escrow", "transfer_bonds", "update_app"
+    ])
+    assert "overspend" in checkpoint.failed["bad/create_bond"]
+    assert "good/update_app" in checkpoint.done and "good/transfer_bonds" in checkpoint.done
+
+    # failed steps are retried on the next run
+    client.reject = lambda stxn: False
+    failed, checkpoint = deploy(client, config)
+    assert failed == []
+    assert_deployed(client, config, checkpoint)
+
+
+def test_deployer_rejects_unknown_dependency(tmp_path):
+    with pytest.raises(ValueError):
+        Deployer(StandinAlgod(), [Step("a", ["b"], run=lambda outputs: {})], Checkpoint(str(tmp_path / "c.json")))
+
+
+def opt_in_group(client, with_payment):
+    compiled = client.compile("escrow")
+    lsig = transaction.LogicSig(base64.b64decode(compiled["result"]))
+    sp = client.suggested_params()
+    creator_key, creator = account.generate_account()
+    txns = [transaction.AssetOptInTxn(logic.address(lsig.logic), sp, 1)]
+    if with_payment:
+        txns.insert(0, transaction.PaymentTxn(creator, sp, logic.address(lsig.logic), 1000000))
+        transaction.assign_group_id(txns)
+    return [
+        transaction.LogicSigTransaction(txn, lsig) if isinstance(txn, transaction.AssetTransferTxn)
+        else txn.sign(creator_key)
+        for txn in txns
+    ]
+
+
+def test_standin_rejects_escrow_opt_in_in_group():
+    client = StandinAlgod()
+    with pytest.raises(AlgodHTTPError, match="rejected by logic"):
+        client.send_transactions(opt_in_group(client, with_payment=True))
+    client.send_transactions(opt_in_group(client, with_payment=False))
@@ -0,0 +1,181 @@
+import copy
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from fuzz import cases, engine
+from fuzz.cases import MUTATIONS, mutate, seeds
+from fuzz.engine import Fuzzer, case_hash, crash_signature, load_dir, normalize_error
+from fuzz.model import Model
+
+TXID = "T" * 52
+OTHER_TXID = "U" * 52
+ADDRESS = "A6BDLTPR4IEIZG4CCUGEXVMZSXTFO7RWNSOWHBWZL3CX2CLWTKW5FF4SE4"
+OTHER_ADDRESS = "EMO2JEPSRWNAJGR62S75GQ4ICOKVNI46AYRERZPJOWYUFEYEZJ6BU5GMXY"
+
+
+class InlinePool:
+    """Runs jobs in this process, in order"""
+
+    def map(self, func, iterable):
+        return [func(job) for job in iterable]
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return map(func, iterable)
+
+
+class ModelDryrun:
+    """Agrees with the model, covering one pc per label and one per txn of the group"""
+
+    def run(self, case):
+        coverage = {("stateful", case.get("label"))} | {("group", i) for i in range(len(case["txns"]))}
+        return Model(case).run(), coverage
+
+
+def init_model_worker():
+    engine._dryrun = ModelDryrun()
+
+
+@pytest.fixture
+def fuzzer(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "_dryrun", ModelDryrun())
+    return Fuzzer(InlinePool(), str(tmp_path / "corpus"), str(tmp_path / "crashes"), seed=0)
+
+
+def error_result(error, num_txns=1):
+    return {"case": {"txns": [cases.payment("investor", "trader", 1)] * num_txns}, "model": {}, "error": error}
+
+
+@pytest.mark.parametrize("case", seeds(), ids=lambda case: case["label"])
+def test_seed_approved_by_model(case):
+    verdicts = Model(case).run()
+    assert verdicts
+    assert all(verdicts.values()), verdicts
+
+
+def test_mutated_cases_run_quickly():
+    corpus = seeds()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for seed in range(20000):
+        verdicts = Model(mutate(random.Random(seed), rng.choice(corpus))).run()
+        assert all(isinstance(approved, bool) for approved in verdicts.values())
+    assert time.perf_counter() - start < 30
+
+
+@pytest.mark.parametrize("mutator", MUTATIONS, ids=lambda mutator: mutator.__name__)
+def test_mutator_changes_case(mutator):
+    rng = random.Random(0)
+    changed = 0
+    for case in seeds():
+        for _ in range(10):
+            mutated = copy.deepcopy(case)
+            mutator(rng, mutated)
+            json.dumps(mutated)
+            assert 1 <= len(mutated["txns"]) <= 16
+            changed += mutated != case
+    assert changed > 0
+
+
+def test_mutate_copies_case():
+    case = seeds()[0]
+    original = copy.deepcopy(case)
+    mutated = mutate(random.Random(0), case, max_mutations=8)
+    assert case == original
+    assert mutated is not case
+
+
+def test_mutate_is_deterministic():
+    case = seeds()[0]
+    assert mutate(random.Random(7), case) == mutate(random.Random(7), case)
+
+
+def test_normalize_error_strips_variable_parts():
+    error = "AlgodHTTPError('TransactionPool.Remember: transaction %s: logic eval error: pc=%d account %s')"
+    assert normalize_error(error % (TXID, 42, ADDRESS)) == normalize_error(error % (OTHER_TXID, 97, OTHER_ADDRESS))
+    assert TXID not in normalize_error(error % (TXID, 42, ADDRESS))
+    assert normalize_error("ConnectionError(0x%s)" % ("ab" * 16)) == "ConnectionError(<hex>)"
+
+
+def test_crash_signature_of_errors():
+    same = error_result("RuntimeError('transaction %s: overspend by 1000')" % TXID)
+    other = error_result("RuntimeError('transaction %s: overspend by 2000')" % OTHER_TXID)
+    different = error_result("RuntimeError('transaction %s: txn dead')" % TXID)
+    assert crash_signature(same) == crash_signature(other)
+    assert crash_signature(same) != crash_signature(different)
+    # not truncated, so errors differing only after a long prefix are distinct
+    prefix = "x" * 100
+    assert crash_signature(error_result(prefix + "a")) != crash_signature(error_result(prefix + "b"))
+
+
+def test_crash_signature_of_mismatches():
+    case = seeds()[0]
+    result = {"case": case, "model": {"0:stateful": True, "1:bondEscrow": True}}
+    result["teal"] = {"0:stateful": False, "1:bondEscrow": True}
+    signature = crash_signature(result)
+    assert signature == ["mismatch", [["buy"]], [["0:stateful", True, False]]]
+    # same divergence with more txns is the same crash
+    longer = copy.deepcopy(result)
+    longer["case"]["txns"].append(cases.payment("investor", "trader", 1))
+    assert crash_signature(longer) == signature
+
+
+def test_save_crash_keeps_smallest_case(fuzzer):
+    error = "RuntimeError('transaction %s: overspend')"
+    fuzzer.save_crash(error_result(error % TXID, num_txns=3))
+    fuzzer.save_crash(error_result(error % OTHER_TXID, num_txns=2))
+    fuzzer.save_crash(error_result(error % TXID, num_txns=4))
+    crashes = load_dir(fuzzer.crash_dir)
+    assert fuzzer.crashes == 1
+    assert len(crashes) == 1
+    assert len(crashes[0]["case"]["txns"]) == 2
+
+    fuzzer.save_crash(error_result("RuntimeError('txn dead')"))
+    assert fuzzer.crashes == 2
+    assert len(load_dir(fuzzer.crash_dir)) == 2
+
+
+def test_fuzz_finds_no_crashes_against_model(fuzzer):
+    assert fuzzer.fuzz(num_cases=200, report_every=3600) == 200
+    assert fuzzer.crashes == 0
+    assert ("stateful", "buy") in fuzzer.coverage
+
+
+def test_minimize_keeps_set_cover(fuzzer):
+    # 2 extra cases whose coverage is contained in the seeds
+    duplicate = copy.deepcopy(fuzzer.corpus[0])
+    duplicate["txns"] = duplicate["txns"][:1]
+    fuzzer.corpus += [copy.deepcopy(fuzzer.corpus[0]), duplicate]
+    for case in fuzzer.corpus:
+        engine.save(os.path.join(fuzzer.corpus_dir, case_hash(case) + ".json"), case)
+    coverage = set().union(*(ModelDryrun().run(case)[1] for case in fuzzer.corpus))
+
+    before, after = fuzzer.minimize()
+
+    assert before == len(seeds()) + 2
+    assert after == len(seeds())
+    assert fuzzer.coverage == coverage
+    kept = load_dir(fuzzer.corpus_dir)
+    assert sorted(map(case_hash, kept)) == sorted(map(case_hash, fuzzer.corpus))
+    assert set().union(*(ModelDryrun().run(case)[1] for case in kept)) == coverage
+
+
+def test_fuzz_for_duration_then_minimize(tmp_path):
+    with multiprocessing.Pool(2, init_model_worker) as pool:
+        fuzzer = Fuzzer(pool, str(tmp_path / "corpus"), str(tmp_path / "crashes"), seed=0)
+        start = time.time()
+        assert fuzzer.fuzz(duration=1, report_every=3600) > 0
+        assert time.time() - start < 20
+
+        # the pool must not still be reading jobs of the fuzz run
+        minimized = []
+        thread = threading.Thread(target=lambda: minimized.append(fuzzer.minimize()), daemon=True)
+        thread.start()
+        thread.join(20)
+        assert minimized, "minimize did not finish"
+        assert minimized[0][1] == len(load_dir(fuzzer.corpus_dir))
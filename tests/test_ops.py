@@ -0,0 +1,420 @@
+import base64
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from algosdk import account
+from algosdk.encoding import decode_address
+from algosdk.error import AlgodHTTPError
+from pyteal import Assert, Global, Int, Mode, Seq, Txn, compileTeal
+
+from deploy.standin import StandinAlgod
+from ops import asserts
+from ops.asserts import AssertMap, compile_traced, explain, instruction_pcs
+from ops.client import BondClient
+from ops.metrics import Metrics, PrometheusSink
+
+TXID = "NKOC4YJ2PNPUWXDB3PPDAW6GFX7R7O3ZLQ7EYJIG2WPQBQ4SQNIA"
+OTHER_TXID = "QD5MLC6DGD7XLPW4ETIDVP3NYEVC3TXR2EX5BUFXB4HHSXMOC4EQ"
+
+
+def contract():
+    return Seq([
+        Assert(Txn.fee() <= Int(1000)),
+        Assert(Global.group_size() == Int(1)),
+        Int(1)
+    ])
+
+
+# contract() as assembled by goal clerk compile (TEAL v4)
+PROGRAM = bytes([
+    0x04,  # version
+    0x20, 0x02, 0x01, 0xe8, 0x07,  # intcblock 1 1000
+    0x31, 0x01,  # 6: txn Fee
+    0x23,  # 8: intc_1
+    0x0e,  # 9: <=
+    0x44,  # 10: assert
+    0x32, 0x04,  # 11: global GroupSize
+    0x22,  # 13: intc_0
+    0x12,  # 14: ==
+    0x44,  # 15: assert
+    0x22,  # 16: intc_0
+    0x43,  # 17: return
+])
+
+
+def line_of(source):
+    with open(__file__) as f:
+        for number, line in enumerate(f, 1):
+            if line.strip() == source:
+                return "test_ops.py:%d" % number, source
+    raise LookupError(source)
+
+
+FEE_ASSERT = line_of("Assert(Txn.fee() <= Int(1000)),")
+GROUP_ASSERT = line_of("Assert(Global.group_size() == Int(1)),")
+
+
+@pytest.fixture(scope="module")
+def assert_map():
+    _, instructions = compile_traced(contract, Mode.Signature, 4)
+    return AssertMap(instructions, PROGRAM)
+
+
+def test_instruction_pcs_of_known_program():
+    assert instruction_pcs(PROGRAM) == [1, 6, 8, 9, 10, 11, 13, 14, 15, 16, 17]
+
+
+def test_instruction_pcs_skips_immediates():
+    program = bytes([
+        0x04,
+        0x26, 0x02, 0x02, 0x61, 0x62, 0x01, 0x63,  # 1: bytecblock "ab" "c"
+        0x81, 0xac, 0x02,  # 8: pushint 300
+        0x80, 0x03, 0x78, 0x79, 0x7a,  # 11: pushbytes "xyz"
+        0x33, 0x00, 0x01,  # 16: gtxn 0 Fee
+        0x37, 0x00, 0x1a, 0x00,  # 19: gtxna 0 ApplicationArgs 0
+        0x40, 0x00, 0x03,  # 23: bnz +3
+        0x88, 0x00, 0x01,  # 26: callsub +1
+        0x43,  # 29: return
+        0x89,  # 30: retsub
+    ])
+    assert instruction_pcs(program) == [1, 8, 11, 16, 19, 23, 26, 29, 30]
+
+
+def test_assert_map_locates_asserts(assert_map):
+    assert assert_map.valid
+    assert assert_map.pcs == [6, 8, 9, 10, 11, 13, 14, 15, 16, 17]
+    assert asserts.describe(assert_map.locate(10)) == FEE_ASSERT
+    assert asserts.describe(assert_map.locate(15)) == GROUP_ASSERT
+    for pc in [0, 1, 6, 9, 12, 14, 17, 100]:
+        assert assert_map.locate(pc) is None
+
+
+def test_assert_map_of_other_program_is_invalid():
+    _, instructions = compile_traced(contract, Mode.Signature, 4)
+    # assert replaced by return
+    other = AssertMap(instructions, PROGRAM[:10] + b"\x43" + PROGRAM[11:])
+    assert not other.valid
+    assert other.locate(15) is None
+    assert not AssertMap(instructions, PROGRAM[:-1]).valid
+
+
+def test_compile_traced_is_thread_safe():
+    teal = compileTeal(contract(), Mode.Signature, version=4)
+    init = Assert.__init__
+    results = []
+
+    def compile_many():
+        for _ in range(20):
+            results.append(compile_traced(contract, Mode.Signature, 4))
+
+    threads = [threading.Thread(target=compile_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 160
+    assert all(result == results[0] for result in results)
+    assert results[0][0] == teal
+    assert [location is not None for _, location in results[0][1]].count(True) == 2
+    assert Assert.__init__ is init
+
+
+@pytest.mark.parametrize("message, logic, expected", [
+    (
+        "TransactionPool.Remember: transaction %s: logic eval error: assert failed pc=15. "
+        "Details: pc=15, opcodes=global GroupSize\nintc_0 // 1\n==\nassert\n" % TXID,
+        False, GROUP_ASSERT
+    ),
+    (
+        "TransactionPool.Remember: transaction %s: rejected by logic err=assert failed pc=10. "
+        "Details: pc=10, opcodes=txn Fee\nintc_1 // 1000\n<=\nassert\n" % TXID,
+        True, FEE_ASSERT
+    ),
+    (
+        "TransactionPool.Remember: transaction %s: logic eval error: assert failed pc=15." % OTHER_TXID,
+        False, ("assert_failed", None)
+    ),
+    (
+        "TransactionPool.Remember: transaction %s: rejected by logic err=assert failed pc=9." % TXID,
+        True, ("logic_sig_rejected", None)
+    ),
+    (
+        "TransactionPool.Remember: transaction %s: logic eval error: err opcode executed pc=16." % TXID,
+        False, ("err_opcode", None)
+    ),
+    (
+        "TransactionPool.Remember: transaction %s: overspend (account %s, data {_struct:{} Status:Offline "
+        "MicroAlgos:{Raw:100000}}, tried to spend {1000000})" % (TXID, "A" * 58),
+        False, ("overspend", None)
+    ),
+    ("TransactionPool.Remember: txn dead: round 1501 outside of 1000--1500", False, ("expired", None)),
+    ("TransactionPool.Remember: transaction already in ledger: %s" % TXID, False, ("duplicate", None)),
+    ("HTTP Error 502: Bad Gateway", False, ("other", None)),
+])
+def test_explain(assert_map, message, logic, expected):
+    programs = {TXID: (assert_map, None) if logic else (None, assert_map)}
+    assert explain(message, programs) == expected
+
+
+def test_prometheus_text():
+    sink = PrometheusSink(buckets=(0.1, 1))
+    metrics = Metrics(sink)
+    metrics.inc("ops_total", op="buy", result="confirmed")
+    metrics.inc("ops_total", 2, op="buy", result="confirmed")
+    metrics.inc("ops_total", op="buy", result="rejected")
+    metrics.add("in_flight", 1, op="buy")
+    metrics.add("in_flight", -1, op="buy")
+    metrics.inc("errors_total", source='a "quoted"\\path\n')
+    for value in [0.05, 0.5, 5]:
+        metrics.observe("seconds", value, op="buy")
+
+    assert sink.text() == "\n".join([
+        '# TYPE errors_total counter',
+        'errors_total{source="a \\"quoted\\"\\\\path\\n"} 1',
+        '# TYPE ops_total counter',
+        'ops_total{op="buy",result="confirmed"} 3',
+        'ops_total{op="buy",result="rejected"} 1',
+        '# TYPE in_flight gauge',
+        'in_flight{op="buy"} 0',
+        '# TYPE seconds histogram',
+        'seconds_bucket{op="buy",le="0.1"} 1',
+        'seconds_bucket{op="buy",le="1"} 2',
+        'seconds_bucket{op="buy",le="+Inf"} 3',
+        'seconds_sum{op="buy"} %r' % (0.05 + 0.5 + 5),
+        'seconds_count{op="buy"} 3',
+    ]) + "\n"
+
+
+def test_prometheus_text_without_labels_or_samples():
+    sink = PrometheusSink()
+    assert sink.text() == "\n"
+    Metrics(sink).inc("total")
+    assert sink.text() == "# TYPE total counter\ntotal 1\n"
+
+
+def test_prometheus_serve():
+    sink = PrometheusSink()
+    Metrics(sink).inc("total")
+    server = sink.serve(0, "127.0.0.1")
+    try:
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.read().decode() == sink.text()
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other")
+    finally:
+        server.shutdown()
+
+
+# BondClient against a ledger of one bond issue
+
+APP_ID = 13
+BOND_ID = 1
+STABLECOIN_ID = 2
+ESCROW_LV = 5
+BOND_COUPON = 25
+
+
+class Ledger(StandinAlgod):
+    """Stand-in with the app of a bond issue, recording every group sent"""
+
+    def __init__(self):
+        super().__init__()
+        self.groups = []
+        self.issuer = account.generate_account()[1]
+        escrows = {}
+        for name, module, asset_id in [
+            ("bond_escrow_addr", "bondEscrow", BOND_ID), ("stablecoin_escrow_addr", "stablecoinEscrow", STABLECOIN_ID)
+        ]:
+            teal = compileTeal(__import__(module).contract(APP_ID, asset_id, ESCROW_LV), Mode.Signature, version=4)
+            escrows[name] = decode_address(self.compile(teal)["hash"])
+        self.set_global(
+            bond_id=BOND_ID, bond_cost=50, bond_coupon=BOND_COUPON, bond_principal=100,
+            issuer_addr=decode_address(self.issuer), ratings=bytes(100), **escrows
+        )
+        self.assets[BOND_ID] = {"index": BOND_ID, "params": {"total": 100}}
+
+    def set_global(self, **state):
+        self.apps[APP_ID] = {"id": APP_ID, "params": {
+            "approval-program": base64.b64encode(b"\x04\x81\x01").decode(),
+            "global-state": key_values(state)
+        }}
+
+    def set_ratings(self, ratings):
+        state = {kv["key"]: kv for kv in self.apps[APP_ID]["params"]["global-state"]}
+        state[base64.b64encode(b"ratings").decode()] = key_values({"ratings": bytes(ratings)})[0]
+        self.apps[APP_ID]["params"]["global-state"] = list(state.values())
+
+    def add_holder(self, bonds, coupons_paid):
+        private_key, address = account.generate_account()
+        self.accounts[address] = {
+            "address": address, "amount": 10 ** 6,
+            "assets": [{"asset-id": BOND_ID, "amount": bonds}, {"asset-id": STABLECOIN_ID, "amount": 0}],
+            "apps-local-state": [{"id": APP_ID, "key-value": key_values({"coupons_paid": coupons_paid})}]
+        }
+        return private_key, address
+
+    def send_transactions(self, group):
+        self.groups.append(group)
+        return super().send_transactions(group)
+
+
+def key_values(state):
+    return [
+        {
+            "key": base64.b64encode(key.encode()).decode(),
+            "value": {"type": 1, "bytes": base64.b64encode(value).decode()} if isinstance(value, bytes)
+            else {"type": 2, "uint": value}
+        }
+        for key, value in state.items()
+    ]
+
+
+@pytest.fixture
+def ledger():
+    return Ledger()
+
+
+@pytest.fixture
+def client(ledger):
+    return BondClient(ledger, APP_ID, STABLECOIN_ID, ESCROW_LV)
+
+
+@pytest.mark.parametrize("rating, coupons_paid, expected", [
+    (0, 0, 25 * 3),
+    (5, 0, 25 * 3),
+    (3, 0, 30 * 3),
+    (1, 0, 36 * 3),
+    (4, 1, 27 * 3),
+])
+def test_coupon_amount_uses_rating_of_next_round(ledger, client, rating, coupons_paid, expected):
+    ratings = bytearray(100)
+    ratings[coupons_paid + 1] = rating
+    # rating of the round after is not used
+    ratings[coupons_paid + 2] = 1
+    ledger.set_ratings(ratings)
+    holder_sk, holder = ledger.add_holder(3, coupons_paid)
+
+    client.coupon(holder_sk)
+    assert ledger.groups[-1][1].transaction.amount == expected
+
+
+def test_suggested_params_not_capped_by_escrow_lv(ledger, client):
+    holder_sk, _ = ledger.add_holder(3, 0)
+    client.coupon(holder_sk)
+    # escrow lv only limits escrow opt-ins, so operations long after it still go through
+    assert all(stxn.transaction.last_valid_round == 1001 for stxn in ledger.groups[-1])
+
+
+def test_trade_lsig_caps_only_bond_transfer(ledger, client):
+    seller_sk, seller = ledger.add_holder(3, 0)
+    buyer_sk, _ = ledger.add_holder(0, 0)
+    lsig = client.sign_trade(seller_sk, 70, 500)
+    assert client.sign_trade(seller_sk, 70, 500) is lsig
+    assert client.sign_trade(seller_sk, 70, 600).logic != lsig.logic
+
+    client.trade_lsig(buyer_sk, seller, lsig, 70, 2, 500)
+    app_call, bond_transfer, payment = [stxn.transaction for stxn in ledger.groups[-1]]
+    assert bond_transfer.last_valid_round == 499
+    assert app_call.last_valid_round == payment.last_valid_round == 1001
+    assert payment.amount == 140
+
+
+def test_trade_lsig_rejects_expired_lsig(ledger, client):
+    seller_sk, seller = ledger.add_holder(3, 0)
+    buyer_sk, _ = ledger.add_holder(0, 0)
+    lsig = client.sign_trade(seller_sk, 70, 1)
+    with pytest.raises(ValueError, match="expired"):
+        client.trade_lsig(buyer_sk, seller, lsig, 70, 2, 1)
+    assert not ledger.groups
+
+
+def test_rejection_is_explained(ledger, client):
+    holder_sk, _ = ledger.add_holder(3, 0)
+
+    def reject(group):
+        raise AlgodHTTPError("TransactionPool.Remember: txn dead: round 1501 outside of 1000--1500", 400)
+
+    ledger.send_transactions = reject
+    with pytest.raises(Exception) as e:
+        client.coupon(holder_sk)
+    assert type(e.value).__name__ == "Rejected"
+    assert e.value.assertion == "expired"
+
+
+@pytest.mark.parametrize("sender_paid, receiver_paid, lagging", [(1, 0, "receiver"), (0, 1, "sender")])
+def test_trade_coupon_pays_lagging_party(ledger, sender_paid, receiver_paid, lagging):
+    sink = PrometheusSink()
+    client = BondClient(ledger, APP_ID, STABLECOIN_ID, ESCROW_LV, Metrics(sink))
+    # rating 3 in round 1 and 2 in round 2
+    ledger.set_ratings(bytes([0, 3, 2]) + bytes(97))
+    sender_sk, sender = ledger.add_holder(4, sender_paid)
+    _, receiver = ledger.add_holder(2, receiver_paid)
+
+    client.trade_coupon(sender_sk, receiver, 1)
+    app_call, bond_transfer, coupon = [stxn.transaction for stxn in ledger.groups[-1]]
+    assert app_call.app_args == [b"trade_coupon"]
+    assert app_call.accounts == client.escrow_accounts() + [receiver]
+    assert (bond_transfer.revocation_target, bond_transfer.receiver, bond_transfer.amount) == (sender, receiver, 1)
+    # coupon of the round after the lagging party's, on its balance before the trade
+    assert coupon.receiver == (receiver if lagging == "receiver" else sender)
+    assert coupon.amount == (30 * 2 if lagging == "receiver" else 30 * 4)
+    assert app_call.fee == 3000 and bond_transfer.fee == coupon.fee == 0
+    assert 'bond_ops_total{op="trade_coupon",result="confirmed"} 1' in sink.text()
+
+
+def test_trade_coupon_lsig_puts_payment_last(ledger, client):
+    seller_sk, seller = ledger.add_holder(3, 1)
+    buyer_sk, buyer = ledger.add_holder(1, 0)
+    lsig = client.sign_trade(seller_sk, 70, 500)
+
+    client.trade_coupon_lsig(buyer_sk, seller, lsig, 70, 2, 500)
+    app_call, bond_transfer, coupon, payment = [stxn.transaction for stxn in ledger.groups[-1]]
+    assert ledger.groups[-1][0].lsig is lsig
+    assert app_call.sender == seller and app_call.accounts == client.escrow_accounts() + [buyer]
+    assert bond_transfer.last_valid_round == 499
+    assert (coupon.receiver, coupon.amount) == (buyer, 25)
+    assert (payment.sender, payment.receiver, payment.amount) == (buyer, seller, 140)
+    assert app_call.fee == 1000 and payment.fee == 3000
+
+    with pytest.raises(ValueError, match="expired"):
+        client.trade_coupon_lsig(buyer_sk, seller, lsig, 70, 2, 1)
+
+
+def test_compile_does_not_block_other_ops(ledger, client):
+    holder_sk, _ = ledger.add_holder(3, 0)
+    other_sk, _ = ledger.add_holder(3, 0)
+    seller_sk, _ = ledger.add_holder(3, 0)
+    client.coupon(holder_sk)
+    compile_program = ledger.compile
+    started = threading.Event()
+    release = threading.Event()
+    compiles = []
+
+    def slow_compile(source):
+        compiles.append(source)
+        started.set()
+        release.wait(10)
+        return compile_program(source)
+
+    ledger.compile = slow_compile
+    signers = [threading.Thread(target=client.sign_trade, args=(seller_sk, 70, 500)) for _ in range(4)]
+    for signer in signers:
+        signer.start()
+    try:
+        assert started.wait(10)
+        # escrows and suggested params are cached, so nothing waits on the trade lsig being compiled
+        start = time.monotonic()
+        client.coupon(other_sk)
+        assert time.monotonic() - start < 5
+    finally:
+        release.set()
+        for signer in signers:
+            signer.join()
+    # compiled once for all of the misses at the same time
+    assert len(compiles) == 1